@@ -1,13 +1,10 @@
-from google import genai
-import os
-from dotenv import load_dotenv
-from functools import cache
-from pathlib import Path
 from typing import Optional, List
+import json
 import re
 
-load_dotenv()
-client = genai.Client()
+from .providers import get_provider
+from .scheduler import outbound
+from .cache import cached, TRANSLATION_CACHE_MAX_MB
 
 def split_lyrics_manually(lyrics: str) -> List[dict]:
     """
@@ -31,18 +28,10 @@ def split_lyrics_manually(lyrics: str) -> List[dict]:
             
     return sections
 
-@cache
+@cached("translations", TRANSLATION_CACHE_MAX_MB, store_if=lambda result, text, *args, **kwargs: result != text)
 def translate_with_gemini(text: str, translated_language: str,  start_language: str='English') -> str:
     # make sure GEMINI_API_KEY is defined in your .env file
-    current_dir = Path(__file__).resolve().parent
-    backend_dir = current_dir.parent
-    env_path = backend_dir / '.env'
-    load_dotenv(dotenv_path=env_path)
-    # Also load from default locations as fallback
-    load_dotenv()
-
-    # uses the same one in the .env file
-    client = genai.Client()
+    client = get_provider("gemini")
 
     prompt = f'''
 You are a song translator. For the song below, please translate the song line by line into {translated_language}.
@@ -64,7 +53,8 @@ DO NOT PROVIDE ANY OTHER OUTPUTS OTHER THAN THE SONG LINES IN THE FORMAT ABOVE
 '''
 
     try:
-        response = client.models.generate_content(
+        response = outbound.call(
+            "gemini", client.models.generate_content,
             model='gemini-2.5-flash',
             contents=prompt
         )
@@ -73,14 +63,15 @@ DO NOT PROVIDE ANY OTHER OUTPUTS OTHER THAN THE SONG LINES IN THE FORMAT ABOVE
         print(f"Translation failed: {e}")
         return text
 
-@cache
+@cached("translations", TRANSLATION_CACHE_MAX_MB)
 def translate_text_gemini(text: str, target_language: str) -> Optional[str]:
     """Translation of text using Gemini. Can be a single line or a block."""
     
     prompt = f"Translate the following text to {target_language}. Keep the same number of lines and do not add any explanations or extra text. Only return the translated lines:\n\n{text}"
             
     try:
-        response = client.models.generate_content(
+        response = outbound.call(
+            "gemini", get_provider("gemini").models.generate_content,
             model='gemini-2.5-flash',
             contents=prompt
         )
@@ -120,14 +111,14 @@ ONLY RETURN THE JSON ARRAY. DO NOT PROVIDE ANY OTHER TEXT.
 '''
 
     try:
-        response = client.models.generate_content(
+        response = outbound.call(
+            "gemini", get_provider("gemini").models.generate_content,
             model='gemini-2.5-flash',
             contents=prompt,
             config={
                 'response_mime_type': 'application/json',
             }
         )
-        import json
         structured_data = json.loads(response.text)
         if isinstance(structured_data, list) and len(structured_data) > 0:
             return structured_data
@@ -137,3 +128,63 @@ ONLY RETURN THE JSON ARRAY. DO NOT PROVIDE ANY OTHER TEXT.
         return [{"label": "Lyrics", "content": raw_lyrics}]
 
 
+
+def structure_lyrics_batch_with_gemini(raw_lyrics_list: List[str]) -> List[List[dict]]:
+    """
+    Structures several songs with one Gemini call. Songs that split manually never
+    reach Gemini. Falls back to one call per song if the batch answer doesn't line up.
+    """
+    results: List[Optional[List[dict]]] = []
+    needs_ai = []
+    for i, raw_lyrics in enumerate(raw_lyrics_list):
+        manual_sections = split_lyrics_manually(raw_lyrics)
+        if len(manual_sections) > 1:
+            results.append(manual_sections)
+        else:
+            results.append(None)
+            needs_ai.append(i)
+
+    if not needs_ai:
+        return results
+
+    songs_text = "\n\n".join(
+        f"=== SONG {n + 1} ===\n{raw_lyrics_list[i]}" for n, i in enumerate(needs_ai)
+    )
+    prompt = f'''
+You are a song lyrics processor. Below are {len(needs_ai)} songs, each starting with a "=== SONG n ===" line.
+Split each song's raw lyrics into distinct sections (e.g., Verse 1, Chorus, Bridge, etc.).
+
+Even if there are no square brackets like [Verse 1], look for logical breaks like:
+- Labels at the start of lines (e.g. "Verse 1:", "Chorus -")
+- Large blocks of text separated by double newlines.
+
+Each section must have a clear "label" and "content".
+Return a JSON array with exactly one entry per song, in order. Each entry is a JSON array of section objects.
+
+{songs_text}
+
+ONLY RETURN THE JSON ARRAY. DO NOT PROVIDE ANY OTHER TEXT.
+'''
+
+    try:
+        response = outbound.call(
+            "gemini", get_provider("gemini").models.generate_content,
+            model='gemini-2.5-flash',
+            contents=prompt,
+            config={
+                'response_mime_type': 'application/json',
+            }
+        )
+        structured_data = json.loads(response.text)
+        if not isinstance(structured_data, list) or len(structured_data) != len(needs_ai):
+            raise ValueError(f"expected {len(needs_ai)} songs, got {len(structured_data) if isinstance(structured_data, list) else 'no list'}")
+        for i, sections in zip(needs_ai, structured_data):
+            if isinstance(sections, list) and sections:
+                results[i] = sections
+    except Exception as e:
+        print(f"Batched lyrics structuring failed, structuring one by one: {e}")
+
+    for i in needs_ai:
+        if results[i] is None:
+            results[i] = structure_lyrics_with_gemini(raw_lyrics_list[i])
+    return results
@@ -1,22 +1,7 @@
-from random import choice
 import re
-from meaningless import WebExtractor
-import meaningless
-from meaningless.utilities.exceptions import InvalidSearchError
-from google import genai
-import os
-from dotenv import load_dotenv
-from pathlib import Path
 
-# Load env to get API key if needed
-# explicitly look for .env in the backend directory (parent of app)
-current_dir = Path(__file__).resolve().parent
-backend_dir = current_dir.parent
-env_path = backend_dir / '.env'
-load_dotenv(dotenv_path=env_path)
-
-# Also try loading from current working directory or parents (default behavior) for good measure
-load_dotenv()
+from .providers import get_provider
+from .scheduler import outbound
 
 def bible_passage_auto(verse_reference: str, output_translation="NIV", verse_max=2, newlines_max=4):
     '''
@@ -27,13 +12,14 @@ def bible_passage_auto(verse_reference: str, output_translation="NIV", verse_max
         return []
 
     try:
-        extractor = WebExtractor(translation=output_translation, output_as_list=True)
+        extractor = get_provider("bible_extractor")(output_translation)
         verse_reference = re.sub(r'\([^)]*\)', '', verse_reference).strip().title()
         verse_text = extractor.search(verse_reference)
-    except (InvalidSearchError, Exception) as e:
+    except Exception as e:
+        # Covers meaningless' InvalidSearchError as well as network errors
         print(f"Meaningless failed: {e}. Trying GenAI...")
         
-        client = genai.Client()
+        client = get_provider("gemini")
 
         # UPDATED PROMPT: Explicitly request newlines and verse numbers for easier parsing
         prompt = (
@@ -43,7 +29,8 @@ def bible_passage_auto(verse_reference: str, output_translation="NIV", verse_max
         )
         
         try:
-            response = client.models.generate_content(
+            response = outbound.call(
+                "gemini", client.models.generate_content,
                 model="gemini-2.5-flash",
                 contents=prompt
             )
@@ -0,0 +1,149 @@
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+
+class DiskBlobStore:
+    """
+    Blobs on local disk, usually content-addressed. Files are named after their key and
+    the least recently used ones are evicted once the store grows past max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        # Fan out into sub-directories so no single directory gets huge
+        return os.path.join(self.directory, key[:2], key)
+
+    def _all_files(self) -> List[str]:
+        files = []
+        if not os.path.exists(self.directory):
+            return files
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    files.append(os.path.join(root, name))
+        return files
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        # Touch the file so eviction treats it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        # Content-addressed keys never change, but run records and decks are rewritten
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers (and other workers) never see half a blob
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(os.path.getsize(f) for f in self._all_files())
+            else:
+                self._total_bytes += len(data) - replaced
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Removes the oldest blobs until the store is back under 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for path in self._all_files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total
+
+    def usage(self) -> Dict[str, Any]:
+        # The size is only counted once something has been written
+        return {"bytes": self._total_bytes, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+class GridFSBlobStore:
+    """Shared blob tier kept in MongoDB GridFS so every instance can reuse it."""
+
+    def __init__(self, uri: str, db_name: str, bucket: str):
+        # Imported here so the disk-only setup doesn't need a sync Mongo client
+        import certifi
+        import gridfs
+        from pymongo import MongoClient
+
+        client = MongoClient(uri, tlsCAFile=certifi.where())
+        self._fs = gridfs.GridFS(client[db_name], collection=bucket)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            grid_out = self._fs.find_one({"filename": key})
+            return grid_out.read() if grid_out else None
+        except Exception as e:
+            print(f"GridFS read failed: {e}")
+            return None
+
+    def put(self, key: str, data: bytes):
+        try:
+            if not self._fs.exists(filename=key):
+                self._fs.put(data, filename=key)
+        except Exception as e:
+            print(f"GridFS write failed: {e}")
+
+class TieredBlobStore:
+    """Checks each store in order and backfills the faster ones on a hit."""
+
+    def __init__(self, stores: list):
+        self.stores = stores
+
+    def get(self, key: str) -> Optional[bytes]:
+        for i, store in enumerate(self.stores):
+            data = store.get(key)
+            if data is not None:
+                for faster in self.stores[:i]:
+                    faster.put(key, data)
+                return data
+        return None
+
+    def put(self, key: str, data: bytes):
+        for store in self.stores:
+            store.put(key, data)
@@ -0,0 +1,302 @@
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .blob_store import DiskBlobStore
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Leave CACHE_BACKEND unset to keep each cache where it has always lived
+# (translations in memory, rendered slides and previews on disk). With several
+# workers set it to "sqlite" (one file shared on this machine) or "redis"
+# (shared between machines) so they all reuse each other's work.
+CACHE_BACKENDS = ("memory", "disk", "sqlite", "redis")
+
+TRANSLATION_CACHE_MAX_MB = int(os.environ.get("TRANSLATION_CACHE_MAX_MB", "64"))
+
+def backend_setting() -> str:
+    return os.environ.get("CACHE_BACKEND", "").lower()
+
+def cache_dir() -> str:
+    return os.environ.get("CACHE_DIR", os.path.join(BACKEND_DIR, ".cache"))
+
+class MemoryStore:
+    """Per-process LRU, bounded by the total size of the values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes):
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._items[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            data = self._items.pop(key, None)
+            if data is not None:
+                self._bytes -= len(data)
+
+    def usage(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._bytes, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+RECOUNT_EVERY = 32
+# How stale a row's last-used time may get before a read refreshes it
+USED_UPDATE_INTERVAL_S = 60
+
+class SQLiteStore:
+    """
+    One table per cache in a SQLite file, safe to share between worker processes
+    on the same machine. Least recently used rows go once the table is over budget.
+    """
+
+    def __init__(self, path: str, table: str, max_bytes: int):
+        if not re.fullmatch(r"[a-z_]+", table):
+            raise ValueError(f"Bad cache name: {table}")
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_used ON {table} (used)")
+        self._bytes = self._total()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            # WAL lets readers in other workers carry on while one of them writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _total(self) -> int:
+        return self._conn().execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        conn = self._conn()
+        row = conn.execute(f"SELECT value, used FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        # Eviction only needs a rough order, so hot keys don't turn every read into a write
+        now = time.time()
+        if now - row[1] > USED_UPDATE_INTERVAL_S:
+            conn.execute(f"UPDATE {self.table} SET used = ? WHERE key = ?", (now, key))
+        return bytes(row[0])
+
+    def put(self, key: str, data: bytes):
+        self._conn().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, size, used) VALUES (?, ?, ?, ?)",
+            (key, data, len(data), time.time()),
+        )
+        with self._lock:
+            self._bytes += len(data)
+            self._puts += 1
+            # Every so often pick up what the other workers have written
+            if self._puts % RECOUNT_EVERY == 0:
+                self._bytes = self._total()
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _evict(self):
+        """Drops the oldest rows until the table is back under 90% of its budget."""
+        conn = self._conn()
+        # Other workers write too, so recount rather than trusting our running total
+        total = self._total()
+        target = int(self.max_bytes * 0.9)
+        doomed = []
+        for key, size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY used"):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+        self._bytes = total
+
+    def usage(self) -> Dict[str, Any]:
+        entries = self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"entries": entries, "bytes": self._total(), "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+class RedisStore:
+    """
+    Keys in a Redis compatible server (Redis, Valkey, KeyDB), shared by every
+    instance. Size is bounded by the server's maxmemory policy, e.g. allkeys-lru,
+    and every key expires after CACHE_TTL_S.
+    """
+
+    def __init__(self, url: str, prefix: str, ttl: int):
+        # Imported here so only Redis setups need the package
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self.prefix = f"ppt:{prefix}:"
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def put(self, key: str, data: bytes):
+        self._client.set(self.prefix + key, data, ex=self.ttl)
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+    def usage(self) -> Dict[str, Any]:
+        info = self._client.info("memory")
+        return {"used_memory": info.get("used_memory"), "maxmemory": info.get("maxmemory"), "ttl_s": self.ttl}
+
+class Cache:
+    """A named cache on one of the stores above, with hit/miss counts."""
+
+    def __init__(self, name: str, backend: str, store):
+        self.name = name
+        self.backend = backend
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            data = self.store.get(key)
+        except Exception as e:
+            # A cache that's down should cost time, not break a deck
+            print(f"{self.name} cache read failed: {e}")
+            self._count("errors")
+            data = None
+        self._count("hits" if data is not None else "misses")
+        return data
+
+    def put(self, key: str, data: bytes):
+        try:
+            self.store.put(key, data)
+            self._count("puts")
+        except Exception as e:
+            print(f"{self.name} cache write failed: {e}")
+            self._count("errors")
+
+    def delete(self, key: str):
+        try:
+            self.store.delete(key)
+        except Exception as e:
+            print(f"{self.name} cache delete failed: {e}")
+            self._count("errors")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "backend": self.backend,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "puts": self.puts,
+                "errors": self.errors,
+            }
+        try:
+            usage = self.store.usage()
+        except Exception as e:
+            usage = {"error": str(e)}
+        return {**stats, **usage}
+
+_caches: Dict[str, Cache] = {}
+_caches_lock = threading.Lock()
+
+def create_store(name: str, backend: str, max_bytes: int, directory: Optional[str]):
+    if backend == "memory":
+        return MemoryStore(max_bytes)
+    if backend == "disk":
+        return DiskBlobStore(directory or os.path.join(cache_dir(), name), max_bytes)
+    if backend == "sqlite":
+        path = os.environ.get("CACHE_URL") or os.path.join(cache_dir(), "cache.sqlite3")
+        return SQLiteStore(path, name, max_bytes)
+    if backend == "redis":
+        url = os.environ.get("CACHE_URL", "redis://localhost:6379/0")
+        return RedisStore(url, name, int(os.environ.get("CACHE_TTL_S", str(7 * 24 * 3600))))
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend} (expected one of {', '.join(CACHE_BACKENDS)})")
+
+def get_cache(name: str, max_mb: int, default: str = "memory", directory: Optional[str] = None) -> Cache:
+    """
+    Returns the named cache, creating it on first use. CACHE_BACKEND overrides
+    default for every cache. directory only applies to the disk backend.
+    """
+    with _caches_lock:
+        if name not in _caches:
+            backend = backend_setting() or default
+            _caches[name] = Cache(name, backend, create_store(name, backend, max_mb * 1024 * 1024, directory))
+        return _caches[name]
+
+def cache_stats() -> Dict[str, Any]:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+def cache_key(*parts) -> str:
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def cached(name: str, max_mb: int, store_if: Optional[Callable[..., bool]] = None):
+    """
+    Memoizes a function with JSON friendly arguments and result in a named cache,
+    in place of functools.cache. None results are never stored; store_if(result,
+    *args, **kwargs) can also refuse, e.g. when a translation fell back to the input.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_cache(name, max_mb)
+            key = cache_key(fn.__qualname__, args, kwargs)
+            data = cache.get(key)
+            if data is not None:
+                return json.loads(data)
+
+            result = fn(*args, **kwargs)
+            if result is not None and (store_if is None or store_if(result, *args, **kwargs)):
+                cache.put(key, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+            return result
+        return wrapper
+    return decorator
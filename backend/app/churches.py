@@ -0,0 +1,138 @@
+import base64
+import io
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from .models import ChurchProfile, ServiceDetails
+from .database import db
+from .cache import Cache, get_cache
+
+# Request field -> profile field it defaults from
+PROFILE_DEFAULTS = {
+    "church_name": "name",
+    "service_name": "service_name",
+    "service_time": "service_time",
+    "offering": "offering",
+    "template_name": "template_name",
+    "language": "default_language",
+}
+
+# Bigger than any box the generator draws images into
+MAX_IMAGE_PX = 512
+PROFILE_TTL = float(os.environ.get("CHURCH_PROFILE_TTL_S", "300"))
+CHURCH_CACHE_MAX_MB = int(os.environ.get("CHURCH_CACHE_MAX_MB", "32"))
+
+@dataclass
+class ChurchAssets:
+    """A church's images, decoded and resized once, ready to drop into slides."""
+    logo: Optional[bytes] = None
+    tithing: Dict[str, bytes] = field(default_factory=dict)
+
+def get_church_cache() -> Cache:
+    """Profiles and processed images, shared between workers when CACHE_BACKEND is sqlite or redis."""
+    return get_cache("churches", CHURCH_CACHE_MAX_MB)
+
+def encode_assets(assets: ChurchAssets) -> bytes:
+    encode = lambda image: base64.b64encode(image).decode("ascii")
+    return json.dumps({
+        "logo": encode(assets.logo) if assets.logo else None,
+        "tithing": {slot: encode(image) for slot, image in assets.tithing.items()},
+    }).encode("utf-8")
+
+def decode_assets(data: bytes) -> ChurchAssets:
+    stored = json.loads(data)
+    return ChurchAssets(
+        logo=base64.b64decode(stored["logo"]) if stored["logo"] else None,
+        tithing={slot: base64.b64decode(image) for slot, image in stored["tithing"].items()},
+    )
+
+def prepare_image(encoded: str) -> Optional[bytes]:
+    """Decodes a base64 image and shrinks it to a slide-friendly PNG."""
+    from PIL import Image
+
+    try:
+        raw = base64.b64decode(encoded.split(",")[-1]) # tolerate data: URLs
+        image = Image.open(io.BytesIO(raw))
+        image.thumbnail((MAX_IMAGE_PX, MAX_IMAGE_PX))
+        output = io.BytesIO()
+        image.save(output, format="PNG", optimize=True)
+        return output.getvalue()
+    except Exception as e:
+        print(f"Could not process church image: {e}")
+        return None
+
+def prepare_assets(profile: ChurchProfile) -> ChurchAssets:
+    assets = ChurchAssets()
+    if profile.logo:
+        assets.logo = prepare_image(profile.logo)
+    for slot, encoded in profile.tithing_images.items():
+        image = prepare_image(encoded)
+        if image:
+            assets.tithing[slot] = image
+    return assets
+
+def forget_church(church_id: str):
+    # Processed images are keyed by revision, so only the profile needs to go
+    get_church_cache().delete(f"profile-{church_id}")
+
+def load_profile(church_id: str) -> Optional[ChurchProfile]:
+    data = get_church_cache().get(f"profile-{church_id}")
+    if data is None:
+        return None
+    cached = json.loads(data)
+    if time.time() - cached["loaded_at"] > PROFILE_TTL:
+        return None
+    return ChurchProfile(**cached["profile"])
+
+def load_assets(profile: ChurchProfile) -> Optional[ChurchAssets]:
+    data = get_church_cache().get(f"assets-{profile.id}-{profile.revision}")
+    return decode_assets(data) if data is not None else None
+
+def save_church(profile: ChurchProfile, assets: Optional[ChurchAssets]):
+    cache = get_church_cache()
+    # The raw images are only needed to build the assets, leave them in the database
+    stored = profile.dict(exclude={"logo", "tithing_images"})
+    cache.put(f"profile-{profile.id}", json.dumps({"loaded_at": time.time(), "profile": stored}).encode("utf-8"))
+    if assets is not None:
+        cache.put(f"assets-{profile.id}-{profile.revision}", encode_assets(assets))
+
+async def get_church(church_id: str) -> Tuple[ChurchProfile, ChurchAssets]:
+    profile = await run_in_threadpool(load_profile, church_id)
+    if profile:
+        assets = await run_in_threadpool(load_assets, profile)
+        if assets:
+            return profile, assets
+
+    doc = await db.churches.find_one({"id": church_id})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Church not found")
+    profile = ChurchProfile(**doc)
+
+    # Only redo the image work if the profile actually changed
+    assets = await run_in_threadpool(load_assets, profile)
+    fresh = assets is None
+    if fresh:
+        assets = await run_in_threadpool(prepare_assets, profile)
+
+    await run_in_threadpool(save_church, profile, assets if fresh else None)
+    return profile, assets
+
+async def apply_church_profile(request: ServiceDetails) -> Tuple[ServiceDetails, Optional[ChurchAssets]]:
+    """Fills in whatever the request left out from the church's stored profile."""
+    if not request.church_id:
+        return request, None
+
+    profile, assets = await get_church(request.church_id)
+    sent = request.dict(exclude_unset=True)
+    defaults = {
+        request_field: getattr(profile, profile_field)
+        for request_field, profile_field in PROFILE_DEFAULTS.items()
+        if request_field not in sent
+    }
+    return request.copy(update=defaults), assets
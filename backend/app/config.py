@@ -0,0 +1,8 @@
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load env once for the whole app: explicitly from the backend directory (parent of app),
+# then from the current working directory or its parents for good measure
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+load_dotenv(dotenv_path=BACKEND_DIR / '.env')
+load_dotenv()
@@ -1,16 +1,189 @@
+import asyncio
 import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from pymongo.monitoring import ConnectionPoolListener
 import certifi
 
-load_dotenv()
+from . import config  # noqa: F401 - loads .env before reading settings
 
 MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("DB_NAME", "ppt_maker")
 
-# ca=certifi.where() is often needed on macOS for cloud DB connections (Atlas)
-client = AsyncIOMotorClient(MONGODB_URI, tlsCAFile=certifi.where())
-db = client[DB_NAME]
+# Pool size and timeouts, all optional. Timeouts are in milliseconds.
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_MS = int(os.environ.get("MONGO_MAX_IDLE_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+# Every collection is looked up by its application level id
+INDEXES = {
+    "songs": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        # Imports match existing songs by title
+        IndexModel([("title", ASCENDING)], name="title"),
+    ],
+    "plans": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        # The plan list is sorted newest first
+        IndexModel([("date", DESCENDING)], name="date"),
+    ],
+    "churches": [IndexModel([("id", ASCENDING)], unique=True, name="id_unique")],
+    "imports": [IndexModel([("id", ASCENDING)], unique=True, name="id_unique")],
+}
+
+class PoolStats(ConnectionPoolListener):
+    """Counts connection pool events per server, pymongo calls these from its own threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = defaultdict(lambda: {
+            "open": 0,
+            "checked_out": 0,
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "cleared": 0,
+        })
+
+    def _bump(self, address, **changes):
+        with self._lock:
+            stats = self._servers[f"{address[0]}:{address[1]}"]
+            for key, delta in changes.items():
+                stats[key] += delta
+
+    def pool_created(self, event):
+        self._bump(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, created=1, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, closed=1, open=-1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, checkouts=1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, checked_out=-1)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {address: dict(stats) for address, stats in self._servers.items()}
+
+pool_stats = PoolStats()
+_client: Optional[AsyncIOMotorClient] = None
+# Set on shutdown, so late writes fail instead of quietly opening a client nobody closes
+_closed = False
+
+def create_client() -> AsyncIOMotorClient:
+    # ca=certifi.where() is often needed on macOS for cloud DB connections (Atlas)
+    return AsyncIOMotorClient(
+        MONGODB_URI,
+        tlsCAFile=certifi.where(),
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[pool_stats],
+    )
+
+def get_client() -> AsyncIOMotorClient:
+    """The shared client. Scripts get one on first use, the app opens it in its lifespan."""
+    global _client
+    if _client is None:
+        if _closed:
+            raise RuntimeError("The database client has been closed")
+        _client = create_client()
+    return _client
+
+def use_client(client):
+    """Swaps in another client, e.g. an in-memory one for load tests."""
+    global _client
+    _client = client
+
+def connect() -> AsyncIOMotorClient:
+    global _closed
+    _closed = False
+    return get_client()
+
+def close():
+    global _client, _closed
+    _closed = True
+    if _client is not None:
+        _client.close()
+        _client = None
+
+async def ensure_indexes() -> bool:
+    """
+    Creating an index that already exists is a no-op, so this runs on every start.
+    Returns False when the database could not be reached.
+    """
+    # One ping first, so an unreachable database costs one timeout rather than one per collection
+    try:
+        await db.command("ping")
+    except PyMongoError as e:
+        print(f"Skipping index creation, database unreachable: {e}")
+        return False
+
+    async def create(collection: str, indexes: list):
+        try:
+            await db[collection].create_indexes(indexes)
+        except Exception as e:
+            # e.g. duplicate ids from before the unique index existed
+            print(f"Could not create indexes on {collection}: {e}")
+
+    await asyncio.gather(*(create(collection, indexes) for collection, indexes in INDEXES.items()))
+    return True
+
+def pool_report() -> Dict[str, Any]:
+    return {
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        "servers": pool_stats.snapshot(),
+    }
+
+class _Database:
+    """
+    Stands in for the Motor database so `from .database import db` keeps working
+    while the client itself is opened and closed by the app's lifespan.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_client()[DB_NAME], name)
+
+    def __getitem__(self, name):
+        return get_client()[DB_NAME][name]
+
+db = _Database()
 
 async def get_database():
     return db
@@ -0,0 +1,79 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class ProgressChannel:
+    """
+    Fan-out of progress events to any number of Server-Sent Events listeners.
+    Late listeners get the full history first. publish() may be called from
+    worker threads as well as the event loop.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self.history: List[Tuple[str, dict]] = []
+        self._subscribers: Set[asyncio.Queue] = set()
+        self.closed = False
+
+    def publish(self, event: str, data: dict):
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            self._publish(event, data)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, event, data)
+
+    def _publish(self, event: Optional[str], data: Optional[dict]):
+        if self.closed:
+            return
+        if event is None:
+            self.closed = True
+        else:
+            self.history.append((event, data))
+        for queue in self._subscribers:
+            queue.put_nowait((event, data))
+
+    def close(self):
+        """Ends every stream once the events published so far are delivered."""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            self._publish(None, None)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, None, None)
+
+    async def stream(self, keepalive: float = 15.0) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        # Snapshot and subscribe together so nothing is missed or sent twice
+        history = list(self.history)
+        closed = self.closed
+        if not closed:
+            self._subscribers.add(queue)
+
+        try:
+            for event, data in history:
+                yield format_sse(event, data)
+            if closed:
+                return
+
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield format_sse(event, data)
+        finally:
+            self._subscribers.discard(queue)
@@ -1,11 +1,11 @@
-from dotenv import load_dotenv
-import os, lyricsgenius, webbrowser, warnings, re
-from random import randint
+import os, re
+
+from .providers import get_provider
+from .scheduler import outbound
 
 # Path to the root directory containing "Songs" and "Complete Slides" directories
 root_directory = f"{os.path.dirname(__file__)}/../"
 
-load_dotenv()
 # Put your own genius token here
 genius_token = os.environ.get("GENIUS_TOKEN")
 
@@ -38,13 +38,8 @@ def fetch_lyrics(song_name: str, artist: str = ""):
         print("GENIUS_TOKEN not found in environment variables")
         return None
 
-    # Increase timeout if it isn't working
-    genius = lyricsgenius.Genius(genius_token, timeout=100)
-    # We WANT section headers [Verse 1] etc. to help Gemini structure it
-    genius.remove_section_headers = False 
-    genius.skip_non_songs = True
-    
-    song = genius.search_song(song_name, artist, get_full_info=False)
+    genius = get_provider("genius")
+    song = outbound.call("genius", genius.search_song, song_name, artist, get_full_info=False)
 
     if song:
         return {
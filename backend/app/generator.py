@@ -1,51 +1,64 @@
 import os
-from random import choice
-from typing import List, Optional
+import time
+from typing import Callable, Dict, List, Optional
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
 from pptx.enum.shapes import MSO_SHAPE
 from pptx.enum.dml import MSO_THEME_COLOR
 from pptx.dml.color import RGBColor
-from deep_translator import GoogleTranslator
-from functools import cache
 import io
+import weakref
 
 # Import our models and helpers
 from .models import Song, SongSection, GenerateRequest, AnnouncementItem, OfferingInfo
 from .ai_translate import translate_with_gemini, translate_text_gemini
 from .bible import get_correct_copyright_message
+from .providers import get_provider
+from .templates_index import select_template, template_path, seeded_choice, find_blank_layout
+from .cache import cached, cache_key, get_cache, TRANSLATION_CACHE_MAX_MB
+from .slide_cache import song_block_key, get_song_block, put_song_block, fill_slide, serialize_slide_shapes
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 BACKEND_DIR = os.path.dirname(BASE_DIR)
-TEMPLATES_DIR = os.path.join(BACKEND_DIR, 'templates')
 ASSETS_DIR = os.path.join(BACKEND_DIR, 'assets')
 
-def get_template_path(size: str = "medium") -> str:
-    """Finds a template file in the templates directory based on size."""
-    if not os.path.exists(TEMPLATES_DIR):
-        raise FileNotFoundError(f"Templates directory not found: {TEMPLATES_DIR}")
-    
-    all_templates = []
-    for root, dirs, files in os.walk(TEMPLATES_DIR):
-        for file in files:
-            if file.endswith(".pptx"):
-                all_templates.append(os.path.join(root, file))
-    
-    if not all_templates:
-        raise FileNotFoundError("No .pptx templates found.")
-    
-    # Filter by size if possible
-    size_files = [f for f in all_templates if size.lower() in f.lower()]
-    if size_files:
-        return choice(size_files)
-    
-    return choice(all_templates)
+# Called as progress(stage, data) from the generating thread, see runs.py
+ProgressCallback = Optional[Callable[[str, dict], None]]
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+FILE_CACHE_MAX_MB = int(os.environ.get("FILE_CACHE_MAX_MB", "64"))
+
+def load_file_bytes(path: str) -> bytes:
+    """Templates and assets never change while running, so read each one once."""
+    files = get_cache("files", FILE_CACHE_MAX_MB)
+    key = cache_key(path)
+    data = files.get(key)
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+        files.put(key, data)
+    return data
+
+def load_template(path: str) -> Presentation:
+    return Presentation(io.BytesIO(load_file_bytes(path)))
+
+# Presentation part -> index of its blank layout, worked out once per deck
+_blank_layouts = weakref.WeakKeyDictionary()
+
+def blank_layout(prs):
+    # Same rule the template manifest uses, so every caller gets the real blank
+    # layout rather than index 6, which is a picture layout in some templates
+    index = _blank_layouts.get(prs.part)
+    if index is None:
+        index = _blank_layouts[prs.part] = find_blank_layout(prs)
+    return prs.slide_layouts[index]
 
 def create_blank_slide(prs):
-    layout = prs.slide_layouts[6]  # Blank slide layout
-    return prs.slides.add_slide(layout)
+    return prs.slides.add_slide(blank_layout(prs))
 
 def add_text_to_slide(slide, text, prs, font_size, alignment=PP_ALIGN.CENTER, position_percent=0.35,
                      colour=None, bold=False, italic=False, underline=False):
@@ -79,7 +92,7 @@ def create_title_slide(title_text: str, subtitle_text: str, prs, title_size, def
     return prs
 
 def create_text_slide(body_text, prs, body_size, slide_number=0, total_slides=0):
-    blank_slide_layout = prs.slide_layouts[6]
+    blank_slide_layout = blank_layout(prs)
     lyric_slide = prs.slides.add_slide(blank_slide_layout)
 
     body_width = prs.slide_width * 0.9
@@ -99,7 +112,7 @@ def create_text_slide(body_text, prs, body_size, slide_number=0, total_slides=0)
     return prs
 
 def create_title_and_text_slide(title_text, body_text, prs, title_size, body_size):
-    blank_slide_layout = prs.slide_layouts[6]
+    blank_slide_layout = blank_layout(prs)
     slide = prs.slides.add_slide(blank_slide_layout)
 
     title_width = prs.slide_width * 0.9
@@ -134,9 +147,9 @@ def create_title_and_text_slide(title_text, body_text, prs, title_size, body_siz
     
     return prs
 
-def add_title_with_image_on_right(prs: Presentation, title_text: str, image_type: str, left_text_size: int) -> Presentation:
+def add_title_with_image_on_right(prs: Presentation, title_text: str, image_type: str, left_text_size: int, seed: str = "") -> Presentation:
     margin_right = margin_top = prs.slide_height * 0.1
-    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    slide = prs.slides.add_slide(blank_layout(prs))
 
     slide_title = slide.shapes.add_textbox(prs.slide_width * 0.05, margin_top, prs.slide_width * 0.4, prs.slide_height - 2 * margin_top)
     title_text_frame = slide_title.text_frame
@@ -149,32 +162,40 @@ def add_title_with_image_on_right(prs: Presentation, title_text: str, image_type
     if not os.path.exists(directory_path):
         return prs # Skip if not found
 
-    files = [f for f in os.listdir(directory_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    files = sorted(f for f in os.listdir(directory_path) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
     if not files:
         return prs
 
-    image_path = os.path.join(directory_path, choice(files))
+    image_path = os.path.join(directory_path, seeded_choice(files, seed))
     image_width = image_height = prs.slide_height - 2 * margin_top
     
     try:
-        slide.shapes.add_picture(image_path, prs.slide_width - image_width - margin_right, margin_top, width=image_width, height=image_height)
+        slide.shapes.add_picture(io.BytesIO(load_file_bytes(image_path)), prs.slide_width - image_width - margin_right, margin_top, width=image_width, height=image_height)
     except Exception as e:
         print(f"Error adding image: {e}")
 
     return prs
 
-def create_bulletin_slide(slide, prs, date, songs: List[str], verses: List[str], response_songs: List[str], speaker: str, topic: str, church_name: str, service_name: str):
+def create_bulletin_slide(slide, prs, date, songs: List[str], verses: List[str], response_songs: List[str], speaker: str, topic: str, church_name: str, service_name: str,
+                          service_time: str = "9:45 – 11:00 am", logo: Optional[bytes] = None):
     rect = slide.shapes.add_shape(MSO_SHAPE.RECTANGLE, 0, 0, prs.slide_width, prs.slide_height)
     rect.fill.solid()
     rect.fill.fore_color.rgb = RGBColor(255, 255, 255)
 
+    if logo:
+        logo_size = prs.slide_height * 0.12
+        try:
+            slide.shapes.add_picture(io.BytesIO(logo), prs.slide_width * 0.03, prs.slide_height * 0.03, height=logo_size)
+        except Exception as e:
+            print(f"Error adding logo: {e}")
+
     ppt_text_break = "\x0b"
     # Format date nicely
     formatted_date = date.replace("-", ".")
     
     add_text_to_slide(slide, church_name, prs, 30, position_percent=0.05, bold=True, colour="000000")
     add_text_to_slide(slide, f"Welcome to Our {service_name}{ppt_text_break}{formatted_date}", prs, 23, position_percent=0.15, bold=True, colour="000000")
-    add_text_to_slide(slide, f"{service_name} 9:45 – 11:00 am", prs, 20, position_percent=0.35, colour="7030A0", bold=True, underline=True)
+    add_text_to_slide(slide, f"{service_name} {service_time}", prs, 20, position_percent=0.35, colour="7030A0", bold=True, underline=True)
 
     bulletin_summary = {
         "left": [
@@ -200,8 +221,9 @@ def create_bulletin_slide(slide, prs, date, songs: List[str], verses: List[str],
     add_text_to_slide(slide, ppt_text_break.join(bulletin_summary["left"]), prs, 20, position_percent=0.4, alignment=PP_ALIGN.LEFT, bold=True, colour="000000")
     add_text_to_slide(slide, ppt_text_break.join(bulletin_summary["right"]), prs, 20, position_percent=0.4, alignment=PP_ALIGN.CENTER, colour="000000")
 
-def create_offering_slide(prs: Presentation, tithing_heading_size: int, tithing_body_size: int, offering_info: 'OfferingInfo'):
-    slide = prs.slides.add_slide(prs.slide_layouts[6])
+def create_offering_slide(prs: Presentation, tithing_heading_size: int, tithing_body_size: int, offering_info: 'OfferingInfo',
+                          images: Optional[Dict[str, bytes]] = None):
+    slide = prs.slides.add_slide(blank_layout(prs))
     
     # Title
     title_height = Inches(1)
@@ -224,14 +246,14 @@ def create_offering_slide(prs: Presentation, tithing_heading_size: int, tithing_
 
     # Data for offering
     offering_data = [
-        (f"Account name: {offering_info.account_name}", "church.png"),
-        (f"Account number: {offering_info.account_number}", "account_number.png"),
-        (f"BSB: {offering_info.bsb}", "bsb.png"),
-        (f"Please put in \"{offering_info.reference}\" as the reference", "hands.png"),
-        (offering_info.details, "box.png"),
+        (f"Account name: {offering_info.account_name}", "church"),
+        (f"Account number: {offering_info.account_number}", "account_number"),
+        (f"BSB: {offering_info.bsb}", "bsb"),
+        (f"Please put in \"{offering_info.reference}\" as the reference", "hands"),
+        (offering_info.details, "box"),
     ]
 
-    for i, (text, img_file) in enumerate(offering_data):
+    for i, (text, slot) in enumerate(offering_data):
         width_rect = 0.65 * prs.slide_width
         height_rect = box_height
         left_rect = prs.slide_width - (top_first_box + width_rect)
@@ -251,18 +273,22 @@ def create_offering_slide(prs: Presentation, tithing_heading_size: int, tithing_
         p.font.size = Pt(tithing_body_size)
         textbox.text_frame.word_wrap = True
 
-        # Image
-        img_path = os.path.join(ASSETS_DIR, 'Tithing', img_file)
-        if os.path.exists(img_path):
+        # Image: the church's own if it has one, otherwise the bundled icon
+        image = (images or {}).get(slot)
+        img_path = os.path.join(ASSETS_DIR, 'Tithing', f"{slot}.png")
+        if image is None and os.path.exists(img_path):
+            image = load_file_bytes(img_path)
+        if image:
             image_width = image_height = box_height*0.8
             try:
-                slide.shapes.add_picture(img_path, left_rect + box_height*0.1, top_rect + box_height*0.1, image_width, image_height)
+                slide.shapes.add_picture(io.BytesIO(image), left_rect + box_height*0.1, top_rect + box_height*0.1, image_width, image_height)
             except Exception:
                 pass
 
     return prs
 
-@cache
+# Falling back to the untranslated text is not worth remembering
+@cached("translations", TRANSLATION_CACHE_MAX_MB, store_if=lambda result, text, *args, **kwargs: result != text)
 def translate_text(text: str, language: str = 'Mandarin Chinese') -> str:
     # Try Gemini first
     gemini_translated = translate_text_gemini(text, language)
@@ -297,28 +323,74 @@ def translate_text(text: str, language: str = 'Mandarin Chinese') -> str:
     }
     code = lang_map.get(language.lower(), "zh-CN")
     try:
-        return GoogleTranslator(source='auto', target=code).translate(text)
+        return get_provider("google_translate")(text, code)
     except Exception:
         return text
 
-def append_song(prs, song: Song, title_size, font_size, translate: bool = False, language: str = "Chinese (Simplified)"):
+def append_song(prs, song: Song, title_size, font_size, translate: bool = False, language: str = "Chinese (Simplified)",
+                progress: ProgressCallback = None) -> bool:
+    """
+    Adds a song's slides, reusing a previously rendered block when one is cached.
+    Returns True on a cache hit.
+    """
+    key = song_block_key(song, prs, title_size, font_size, translate, language)
+    cached_block = get_song_block(key)
+    if cached_block is not None:
+        for shapes_xml in cached_block:
+            fill_slide(create_blank_slide(prs), shapes_xml)
+        return True
+
+    first_slide = len(prs.slides)
+    fully_rendered = render_song(prs, song, title_size, font_size, translate, language, progress)
+    # Don't persist blocks where translation fell back to the original text
+    if fully_rendered:
+        put_song_block(key, list(prs.slides)[first_slide:])
+    return False
+
+def arrange_sections(song: Song) -> List[SongSection]:
+    """
+    Lists the sections in the order they are sung. Repeats (a ref to an earlier
+    label, an arrangement entry, or simply identical content) come back as the
+    same SongSection object, so callers can render each one only once.
+    """
+    by_label = {}
+    by_content = {}
+    resolved = []
+    for section in song.sections:
+        source = section
+        if section.ref and section.ref in by_label:
+            source = by_label[section.ref]
+        elif section.content.strip():
+            source = by_content.setdefault(section.content.strip(), section)
+        by_label.setdefault(section.label, source)
+        resolved.append(source)
+
+    if song.arrangement:
+        return [by_label[label] for label in song.arrangement if label in by_label]
+    return resolved
+
+def render_song(prs, song: Song, title_size, font_size, translate: bool = False, language: str = "Chinese (Simplified)",
+                progress: ProgressCallback = None) -> bool:
+    """Builds a song's slides from scratch. Returns False if any translation failed."""
+    fully_translated = True
     translation_map = {}
+    sections = arrange_sections(song)
     if translate:
-        # Collect all unique lines from the song to translate in one go
-        all_lines = []
-        for section in song.sections:
-            section_lines = [l.strip() for l in section.content.split('\n') if l.strip()]
-            all_lines.extend(section_lines)
-        
-        # Deduplicate while preserving order
-        unique_lines = []
-        for l in all_lines:
-            if l not in unique_lines:
-                unique_lines.append(l)
+        # Collect all unique lines from the song to translate in one go,
+        # dict keys deduplicate while preserving order
+        unique_lines = list(dict.fromkeys(
+            l.strip() for section in sections for l in section.content.split('\n') if l.strip()
+        ))
         
         if unique_lines:
+            started = time.perf_counter()
             text_to_translate = "\n".join(unique_lines)
             translated_text_block = translate_text(text_to_translate, language)
+            if translated_text_block == text_to_translate:
+                fully_translated = False
+            if progress:
+                progress("translation", {"title": song.title, "lines": len(unique_lines),
+                                         "translated": fully_translated, "ms": elapsed_ms(started)})
             translated_lines = translated_text_block.split('\n')
             
             # Map original lines to translated lines
@@ -334,15 +406,24 @@ def append_song(prs, song: Song, title_size, font_size, translate: bool = False,
          ccli_info = f"CCLI Licence No. {song.ccli_number}"
     
     if translate:
-        create_title_slide_translated(song.title, ccli_info, prs, title_size, 8, language)
+        translated_title = create_title_slide_translated(song.title, ccli_info, prs, title_size, 8, language)
+        if translated_title == song.title:
+            fully_translated = False
     else:
         create_title_slide(song.title, ccli_info, prs, title_size)
     
-    # Lyrics Slides
-    for section in song.sections:
+    # Lyrics Slides: each distinct section is built once, repeats copy its finished slides
+    rendered_sections = {}
+    for section in sections:
+        if id(section) in rendered_sections:
+            for shapes_xml in rendered_sections[id(section)]:
+                fill_slide(create_blank_slide(prs), shapes_xml)
+            continue
+
         original_content = section.content.strip()
         if not original_content:
             continue
+        first_slide = len(prs.slides)
 
         # Split into lines
         lines = [line.strip() for line in original_content.split('\n') if line.strip()]
@@ -366,7 +447,9 @@ def append_song(prs, song: Song, title_size, font_size, translate: bool = False,
                 final_text = "\n".join(chunk)
                 create_text_slide(final_text, prs, font_size)
 
-    return prs
+        rendered_sections[id(section)] = [serialize_slide_shapes(slide) for slide in list(prs.slides)[first_slide:]]
+
+    return fully_translated
 
 def create_title_slide_translated(title_text, subtitle_text, prs, title_size, subtitle_size, language):
     blank_slide = create_blank_slide(prs)
@@ -375,23 +458,26 @@ def create_title_slide_translated(title_text, subtitle_text, prs, title_size, su
     full_title = f"{title_text}\n{t_title}"
     add_text_to_slide(blank_slide, full_title, prs, title_size, position_percent=0.2)
     add_text_to_slide(blank_slide, subtitle_text, prs, subtitle_size, position_percent=0.6)
-    return prs
-
-def generate_powerpoint(request: GenerateRequest) -> io.BytesIO:
-    template_path = get_template_path(request.template_name)
-    prs = Presentation(template_path)
-
-    # Font sizes
-    font_map = {
-        'small': {'title': 70, 'song': 53, 'bible': 43, 'tithing': 32},
-        'medium': {'title': 50, 'song': 33, 'bible': 32, 'tithing': 23},
-        'large': {'title': 40, 'song': 27, 'bible': 23, 'tithing': 16}
-    }
-    # Guess size from template name
-    size = 'medium'
-    if 'small' in os.path.basename(template_path): size = 'small'
-    elif 'large' in os.path.basename(template_path): size = 'large'
-    fonts = font_map[size]
+    # The caller checks whether the translation fell back to the original
+    return t_title
+
+def build_presentation(request: GenerateRequest, assets=None, progress: ProgressCallback = None) -> Presentation:
+    """
+    Builds the full service deck in memory without saving it.
+    assets are the church's pre-processed images (see churches.py), if it has a profile.
+    progress, if given, is told about each finished stage with its timing.
+    """
+    def report(stage: str, started: float, **data):
+        if progress:
+            progress(stage, {**data, "ms": elapsed_ms(started)})
+
+    # Same request, same template, so output can be cached and compared
+    started = time.perf_counter()
+    seed = request.template_seed or request.date
+    template = select_template(request.template_name, request.template_id, seed)
+    prs = load_template(template_path(template))
+    fonts = template.fonts
+    report("template", started, id=template.id)
 
     # 1. Start
     create_blank_slide(prs) # Bulletin placeholder (index 0)
@@ -399,8 +485,10 @@ def generate_powerpoint(request: GenerateRequest) -> io.BytesIO:
 
     # 2. Songs
     song_names = [s.title for s in request.songs]
-    for song in request.songs:
-        append_song(prs, song, fonts['title'], fonts['song'], request.translate, request.language)
+    for i, song in enumerate(request.songs):
+        started = time.perf_counter()
+        cached = append_song(prs, song, fonts['title'], fonts['song'], request.translate, request.language, progress)
+        report("song", started, index=i, title=song.title, cached=cached)
 
     # 3. Communion (Detect first Sunday logic can be done in frontend or here)
     # We'll just assume if user wants it, they add a generic "Communion" slide item, but 
@@ -408,12 +496,12 @@ def generate_powerpoint(request: GenerateRequest) -> io.BytesIO:
     try:
         day = int(request.date.split("-")[-1]) # Assuming YYYY-MM-DD
         if 1 <= day <= 7:
-             add_title_with_image_on_right(prs, "Holy Communion", "Communion", fonts['title'] - 10)
+             add_title_with_image_on_right(prs, "Holy Communion", "Communion", fonts['title'] - 10, seed)
     except:
         pass
 
     # 4. Bible
-    add_title_with_image_on_right(prs, 'Bible Reading', 'Bible', fonts['title'] - 10)
+    add_title_with_image_on_right(prs, 'Bible Reading', 'Bible', fonts['title'] - 10, seed)
     
     # Process Bible Verses
     # The request should ideally already have the text, but if we need to fetch it:
@@ -423,12 +511,14 @@ def generate_powerpoint(request: GenerateRequest) -> io.BytesIO:
     # Track used versions for copyright
     used_versions = set()
 
-    for reading in request.bible_readings:
+    for i, reading in enumerate(request.bible_readings):
+        started = time.perf_counter()
         verse_parts = bible_passage_auto(f"{reading.reference} ({reading.version})")
         used_versions.add(reading.version)
         
         for part in verse_parts:
              create_title_and_text_slide(f"{reading.reference} ({reading.version})", part, prs, fonts['title'], fonts['bible'])
+        report("reading", started, index=i, reference=f"{reading.reference} ({reading.version})", slides=len(verse_parts))
     
     # Copyright
     for version in used_versions:
@@ -439,11 +529,14 @@ def generate_powerpoint(request: GenerateRequest) -> io.BytesIO:
     verse_refs = [f"{r.reference} ({r.version})" for r in request.bible_readings]
     response_song_names = [s.title for s in request.response_songs]
     
-    create_bulletin_slide(prs.slides[0], prs, request.date, song_names, verse_refs, response_song_names, request.speaker, request.topic, request.church_name, request.service_name)
+    create_bulletin_slide(prs.slides[0], prs, request.date, song_names, verse_refs, response_song_names, request.speaker, request.topic, request.church_name, request.service_name,
+                          request.service_time, assets.logo if assets else None)
 
     # 6. Response Songs
-    for song in request.response_songs:
-        append_song(prs, song, fonts['title'], fonts['song'], request.translate, request.language)
+    for i, song in enumerate(request.response_songs):
+        started = time.perf_counter()
+        cached = append_song(prs, song, fonts['title'], fonts['song'], request.translate, request.language, progress)
+        report("response_song", started, index=i, title=song.title, cached=cached)
 
     # 7. Announcements & Tithing
     valid_announcements = [ann for ann in request.announcements if ann.title.strip()]
@@ -455,7 +548,7 @@ def generate_powerpoint(request: GenerateRequest) -> io.BytesIO:
             else:
                 create_title_slide(ann.title.strip(), '', prs, fonts['title'])
 
-    create_offering_slide(prs, fonts['title'], fonts['tithing'], request.offering)
+    create_offering_slide(prs, fonts['title'], fonts['tithing'], request.offering, assets.tithing if assets else None)
     
     valid_prayer_points = [p.strip() for p in request.prayer_points if p.strip()]
     if valid_prayer_points:
@@ -467,8 +560,16 @@ def generate_powerpoint(request: GenerateRequest) -> io.BytesIO:
     if request.mingle_text and request.mingle_text.strip():
         create_title_slide(request.mingle_text.strip(), '', prs, fonts['title'])
 
+    return prs
+
+def generate_powerpoint(request: GenerateRequest, assets=None, progress: ProgressCallback = None) -> io.BytesIO:
+    prs = build_presentation(request, assets, progress)
+
     # Output
+    started = time.perf_counter()
     output = io.BytesIO()
     prs.save(output)
     output.seek(0)
+    if progress:
+        progress("save", {"slides": len(prs.slides), "bytes": output.getbuffer().nbytes, "ms": elapsed_ms(started)})
     return output
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import re
+import uuid
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from .models import Song, SetlistItem, ImportItem, ImportJob
+from .database import db
+from .events import ProgressChannel
+from .fetch_lyrics import fetch_lyrics
+from .ai_translate import split_lyrics_manually, structure_lyrics_batch_with_gemini
+from .scheduler import Priority, run_with_priority
+from .song_codec import song_for_storage
+
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", "4"))
+GEMINI_BATCH_SIZE = int(os.environ.get("IMPORT_GEMINI_BATCH", "5"))
+WRITE_BATCH_SIZE = int(os.environ.get("IMPORT_WRITE_BATCH", "20"))
+
+# Jobs running in this process, so event streams can attach to them
+_running: Dict[str, ProgressChannel] = {}
+_tasks = set()
+
+# Column names seen in the header row of exported setlists
+HEADER_COLUMNS = {"title", "song", "song title", "artist", "author", "authors", "ccli", "ccli #", "ccli number", "key", "tempo", "bpm"}
+SETLIST_HEADING = re.compile(r'^setlist\s*(?::.*)?$', re.IGNORECASE)
+
+def is_header(line: str) -> bool:
+    if SETLIST_HEADING.match(line):
+        return True
+    fields = [f.strip().lower() for f in line.split("\t") if f.strip()]
+    return len(fields) > 1 and all(f in HEADER_COLUMNS for f in fields)
+
+CCLI_PATTERN = re.compile(r'\(?\s*CCLI\s*(?:Song)?\s*(?:#|No\.?|Number)?\s*:?\s*(\d+)\s*\)?', re.IGNORECASE)
+
+def parse_setlist(text: str) -> List[SetlistItem]:
+    """
+    Reads a pasted setlist, one song per line. Understands "Title - Artist",
+    "Title by Artist", tab separated exports and "CCLI Song # 1234" markers.
+    """
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or is_header(line):
+            continue
+        # Drop list numbering like "1." or "2)"
+        line = re.sub(r'^\d+\s*[.)]\s*', '', line)
+
+        ccli_number = None
+        if "\t" in line:
+            fields = [f.strip() for f in line.split("\t") if f.strip()]
+            numbers = [f for f in fields if f.isdigit()]
+            words = [f for f in fields if not f.isdigit()]
+            ccli_number = numbers[0] if numbers else None
+            title = words[0] if words else ""
+            artist = words[1] if len(words) > 1 else ""
+        else:
+            match = CCLI_PATTERN.search(line)
+            if match:
+                ccli_number = match.group(1)
+                line = (line[:match.start()] + line[match.end():]).strip()
+            # A dash wins when there is one. Otherwise only a lowercase " by " separates the
+            # artist: exports write "Title by Artist", while titles are title-cased ("Saved By Grace")
+            parts = re.split(r'\s+[-–]\s+', line, maxsplit=1)
+            if len(parts) == 1:
+                parts = re.split(r'\s+by\s+(?!.*\sby\s)', line, maxsplit=1)
+            title = parts[0].strip()
+            artist = parts[1].strip() if len(parts) > 1 else ""
+
+        if title:
+            items.append(SetlistItem(title=title, artist=artist, ccli_number=ccli_number))
+    return items
+
+async def create_job(items: List[SetlistItem]) -> ImportJob:
+    job = ImportJob(id=str(uuid.uuid4()), items=[ImportItem(**item.dict()) for item in items])
+    await db.imports.insert_one(job.dict())
+    return job
+
+async def load_job(job_id: str) -> Optional[ImportJob]:
+    doc = await db.imports.find_one({"id": job_id})
+    return ImportJob(**doc) if doc else None
+
+def get_channel(job_id: str) -> Optional[ProgressChannel]:
+    return _running.get(job_id)
+
+def start_job(job: ImportJob) -> ProgressChannel:
+    """Runs (or resumes) a job in the background. Does nothing if it's already running."""
+    if job.id in _running:
+        return _running[job.id]
+
+    channel = ProgressChannel()
+    _running[job.id] = channel
+    task = asyncio.create_task(run_job(job, channel))
+    # Keep a reference so the task isn't garbage collected mid-import
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return channel
+
+async def save_item(job_id: str, index: int, item: ImportItem):
+    await db.imports.update_one({"id": job_id}, {"$set": {f"items.{index}": item.dict()}})
+
+def item_event(index: int, item: ImportItem) -> dict:
+    return {"index": index, "title": item.title, "status": item.status, "song_id": item.song_id, "error": item.error}
+
+async def skip_existing(job: ImportJob, todo: List[int], channel: ProgressChannel) -> List[int]:
+    """Songs already in the library aren't fetched again."""
+    titles = list({job.items[i].title for i in todo})
+    existing = await db.songs.find({"title": {"$in": titles}}, {"id": 1, "title": 1, "artist": 1}).to_list(length=None)
+    library = {(doc["title"].lower(), (doc.get("artist") or "").lower()): doc["id"] for doc in existing}
+
+    remaining = []
+    for i in todo:
+        item = job.items[i]
+        key = (item.title.lower(), (item.artist or "").lower())
+        # A setlist without artists matches any artist
+        match = library.get(key) or (not item.artist and next(
+            (song_id for (title, _), song_id in library.items() if title == key[0]), None))
+        if match:
+            item.status, item.song_id = "skipped", match
+            await save_item(job.id, i, item)
+            channel.publish("song", item_event(i, item))
+        else:
+            remaining.append(i)
+    return remaining
+
+async def fetch_items(job: ImportJob, todo: List[int], channel: ProgressChannel):
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+
+    async def fetch_one(i: int):
+        item = job.items[i]
+        if item.lyrics:
+            return # fetched before the job was interrupted
+        async with semaphore:
+            try:
+                result = await run_in_threadpool(run_with_priority, Priority.BACKGROUND, fetch_lyrics, item.title, item.artist or "")
+            except Exception as e:
+                result = None
+                item.error = str(e)
+        if not result:
+            item.status = "failed"
+            item.error = item.error or "Song not found on Genius"
+        else:
+            item.status, item.error = "fetched", None
+            item.title, item.artist, item.lyrics = result["title"], result["artist"], result["lyrics"]
+        await save_item(job.id, i, item)
+        channel.publish("song", item_event(i, item))
+
+    await asyncio.gather(*(fetch_one(i) for i in todo))
+
+async def write_songs(job: ImportJob, batch: List[tuple], channel: ProgressChannel):
+    """One insert_many for the whole batch, then mark the items done."""
+    if not batch:
+        return
+    songs = [song for _, song in batch]
+    await db.songs.insert_many([song_for_storage(song.dict()) for song in songs])
+    for i, song in batch:
+        item = job.items[i]
+        item.status, item.song_id, item.lyrics = "done", song.id, None
+        await save_item(job.id, i, item)
+        channel.publish("song", item_event(i, item))
+
+async def structure_and_write(job: ImportJob, todo: List[int], channel: ProgressChannel):
+    fetched = [i for i in todo if job.items[i].status == "fetched"]
+
+    # Square bracket headers need no AI, write those straight away
+    ready = []
+    needs_ai = []
+    for i in fetched:
+        sections = split_lyrics_manually(job.items[i].lyrics)
+        if len(sections) > 1:
+            ready.append((i, sections))
+        else:
+            needs_ai.append(i)
+
+    for start in range(0, len(needs_ai), GEMINI_BATCH_SIZE):
+        chunk = needs_ai[start:start + GEMINI_BATCH_SIZE]
+        structured = await run_in_threadpool(
+            run_with_priority, Priority.BACKGROUND, structure_lyrics_batch_with_gemini,
+            [job.items[i].lyrics for i in chunk]
+        )
+        ready.extend(zip(chunk, structured))
+        channel.publish("structured", {"songs": len(chunk)})
+
+    batch = []
+    for i, sections in ready:
+        item = job.items[i]
+        batch.append((i, Song(
+            id=str(uuid.uuid4()), title=item.title, artist=item.artist,
+            ccli_number=item.ccli_number, sections=sections,
+        )))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            await write_songs(job, batch, channel)
+            batch = []
+    await write_songs(job, batch, channel)
+
+async def run_job(job: ImportJob, channel: ProgressChannel):
+    try:
+        await db.imports.update_one({"id": job.id}, {"$set": {"status": "running"}})
+        job.status = "running"
+        channel.publish("started", {"id": job.id, "total": len(job.items)})
+
+        # Finished items are left alone, which is what makes resuming cheap
+        todo = [i for i, item in enumerate(job.items) if item.status not in ("done", "skipped")]
+        todo = await skip_existing(job, todo, channel)
+        await fetch_items(job, todo, channel)
+        await structure_and_write(job, todo, channel)
+
+        job.status = "done"
+    except asyncio.CancelledError:
+        # Shutting down, the finished songs are saved and the rest can be resumed
+        job.status = "failed"
+        channel.publish("error", {"detail": "Import was interrupted, resume it to carry on"})
+        raise
+    except Exception as e:
+        print(f"Import {job.id} failed: {e}")
+        job.status = "failed"
+        channel.publish("error", {"detail": str(e)})
+    finally:
+        await db.imports.update_one({"id": job.id}, {"$set": {"status": job.status}})
+        counts = {}
+        for item in job.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        channel.publish("finished", {"id": job.id, "status": job.status, "counts": counts})
+        channel.close()
+        _running.pop(job.id, None)
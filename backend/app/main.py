@@ -1,18 +1,78 @@
-from fastapi import FastAPI, HTTPException, Response
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 import json
 import os
 import uuid
 from typing import List
 
-from .models import Song, GenerateRequest
-from .generator import generate_powerpoint
+from pymongo.errors import DuplicateKeyError
+
+from .models import Song, GenerateRequest, ServicePlan, ChurchProfile, TemplateInfo, SetlistImportRequest, ImportJob
 from .bible import bible_passage_auto
+from . import database
 from .database import db
 from .fetch_lyrics import fetch_lyrics
 from .ai_translate import structure_lyrics_with_gemini
+from .plans import build_generate_request
+from .churches import apply_church_profile, forget_church
+from .events import format_sse
+from . import imports
+from . import runs
+from .song_codec import song_for_storage, unpack_song
+from .compression import compressed_json_response
+from .warmup import run_warmup
+from .scheduler import outbound, Priority, run_with_priority
+# The generator and previewer (python-pptx, Pillow) are imported on first use
+# so cold starts can answer /health without loading them.
+
+# Warn when importing the app gets slower than this, cold starts pay for it
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "1500"))
+# How long shutdown waits for running imports and generations before cancelling them
+SHUTDOWN_GRACE_S = float(os.environ.get("SHUTDOWN_GRACE_S", "10"))
+startup_report = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database.connect()
+    # In the background, so the app (and /health) can serve while indexes build
+    # or while an unreachable database times out
+    index_task = None
+    if os.environ.get("DB_ENSURE_INDEXES", "true").lower() == "true":
+        index_task = asyncio.create_task(ensure_indexes_in_background())
+
+    started = time.perf_counter()
+    startup_report["warmup_ms"] = await run_warmup()
+    startup_report["warmup_total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    yield
+    if index_task:
+        index_task.cancel()
+    # Background work writes its final status through the client, so it goes first
+    await stop_background_tasks()
+    database.close()
 
-app = FastAPI(title="PPT Generator API")
+async def stop_background_tasks():
+    tasks = imports._tasks | runs._tasks
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_GRACE_S)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+async def ensure_indexes_in_background():
+    started = time.perf_counter()
+    created = await database.ensure_indexes()
+    startup_report["indexes"] = "created" if created else "skipped"
+    startup_report["indexes_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+app = FastAPI(title="PPT Generator API", lifespan=lifespan)
 
 # Allow CORS for frontend
 app.add_middleware(
@@ -24,31 +84,54 @@ app.add_middleware(
 )
 
 @app.get("/songs", response_model=List[Song])
-async def get_songs():
+async def get_songs(request: Request):
     songs_cursor = db.songs.find({})
     songs = await songs_cursor.to_list(length=None)
     # Map MongoDB documents to Song objects (Pydantic handles extra fields like _id by default, 
     # but we pass the dict. 'id' should be in the doc from migration/creation)
-    return [Song(**song) for song in songs]
+    # The full library is large, so compress it for clients that accept it.
+    # Unpacking, serializing and compressing it all is CPU work, keep it off the event loop
+    return await run_in_threadpool(
+        lambda: compressed_json_response(request, [Song(**unpack_song(song)) for song in songs])
+    )
 
 @app.post("/songs", response_model=Song)
 async def create_song(song: Song):
     if not song.id:
         song.id = str(uuid.uuid4())
+    song.revision = 1
     
-    song_dict = song.dict()
-    await db.songs.insert_one(song_dict)
+    song_dict = song_for_storage(song.dict())
+    try:
+        await db.songs.insert_one(song_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"A song with id {song.id} already exists")
     return song
 
 @app.put("/songs/{song_id}", response_model=Song)
 async def update_song(song_id: str, updated_song: Song):
     # Ensure ID matches
     updated_song.id = song_id
-    
-    result = await db.songs.replace_one({"id": song_id}, updated_song.dict())
+
+    existing = await db.songs.find_one({"id": song_id}, {"revision": 1})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Song not found")
+
+    # Songs saved before revisions existed count as revision 1
+    current_revision = existing.get("revision", 1)
+    # The client says which revision it was editing, reject edits made on an older copy
+    if "revision" in updated_song.dict(exclude_unset=True) and updated_song.revision != current_revision:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Song is at revision {current_revision}, you edited revision {updated_song.revision}, please reload"
+        )
+    updated_song.revision = current_revision + 1
+
+    # Only replace if nobody else bumped the revision in the meantime
+    result = await db.songs.replace_one({"id": song_id, "revision": existing.get("revision")}, song_for_storage(updated_song.dict()))
     
     if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Song not found")
+        raise HTTPException(status_code=409, detail="Song was modified concurrently, please reload")
         
     return updated_song
 
@@ -63,11 +146,12 @@ async def delete_song(song_id: str):
 
 @app.get("/songs/search")
 async def search_song_lyrics(title: str, artist: str = ""):
-    result = fetch_lyrics(title, artist)
+    # Outbound calls may queue for quota, so keep them off the event loop
+    result = await run_in_threadpool(run_with_priority, Priority.INTERACTIVE, fetch_lyrics, title, artist)
     if not result:
         raise HTTPException(status_code=404, detail="Song not found on Genius")
     
-    sections = structure_lyrics_with_gemini(result["lyrics"])
+    sections = await run_in_threadpool(run_with_priority, Priority.INTERACTIVE, structure_lyrics_with_gemini, result["lyrics"])
     
     return {
         "title": result["title"],
@@ -75,32 +159,324 @@ async def search_song_lyrics(title: str, artist: str = ""):
         "sections": sections
     }
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.post("/songs/import", response_model=ImportJob)
+async def import_setlist(request: SetlistImportRequest):
+    """Starts importing a whole setlist from Genius. Follow along at /songs/import/{id}/events."""
+    items = list(request.songs)
+    if request.setlist:
+        items.extend(imports.parse_setlist(request.setlist))
+    if not items:
+        raise HTTPException(status_code=400, detail="No songs to import")
+
+    job = await imports.create_job(items)
+    imports.start_job(job)
+    return job
+
+@app.get("/songs/import/{job_id}", response_model=ImportJob)
+async def get_import(job_id: str):
+    job = await imports.load_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return job
+
+@app.post("/songs/import/{job_id}/resume", response_model=ImportJob)
+async def resume_import(job_id: str):
+    """Picks up where a failed or interrupted import stopped. Finished songs are kept."""
+    job = await imports.load_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    imports.start_job(job)
+    return job
+
+@app.get("/songs/import/{job_id}/events")
+async def import_events(job_id: str):
+    channel = imports.get_channel(job_id)
+    if channel:
+        return StreamingResponse(channel.stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    # Not running here (finished, or interrupted by a restart): send where it stands
+    job = await imports.load_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+
+    async def snapshot():
+        for i, item in enumerate(job.items):
+            yield format_sse("song", imports.item_event(i, item))
+        yield format_sse("finished", {"id": job.id, "status": job.status})
+
+    return StreamingResponse(snapshot(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.get("/bible")
 async def get_bible_passage(ref: str, version: str = "NIV"):
     """Returns the text for a given reference."""
-    verses = bible_passage_auto(f"{ref} ({version})", output_translation=version)
+    verses = await run_in_threadpool(
+        run_with_priority, Priority.INTERACTIVE, bible_passage_auto, f"{ref} ({version})", output_translation=version
+    )
     if not verses:
         raise HTTPException(status_code=404, detail="Passage not found")
     return {"reference": ref, "version": version, "text": verses}
 
+async def check_template(request: GenerateRequest):
+    """An unknown template id is the caller's mistake, report it before doing any work."""
+    if not request.template_id:
+        return
+    from .templates_index import get_template_manifest
+    manifest = await run_in_threadpool(get_template_manifest)
+    if request.template_id not in manifest:
+        raise HTTPException(status_code=400, detail=f"Unknown template: {request.template_id}, see GET /templates")
+
+async def build_pptx_response(request: GenerateRequest) -> Response:
+    await check_template(request)
+    try:
+        content = await runs.generate_deck(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    headers = {
+        'Content-Disposition': f'attachment; filename="Service_{request.date}.pptx"'
+    }
+    return Response(content=content, media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation", headers=headers)
+
 @app.post("/generate")
 async def generate_ppt(request: GenerateRequest):
+    return await build_pptx_response(request)
+
+@app.post("/generate/runs")
+async def start_generation(request: GenerateRequest):
+    """
+    Starts building a deck in the background. Follow it at events_url and fetch
+    the file from download_url. Submitting the same request while it is still building joins that run.
+    """
+    await check_template(request)
+    return await runs.start_run(request)
+
+async def find_generation(run_id: str) -> dict:
+    status = await runs.run_status(run_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    return status
+
+@app.get("/generate/runs/{run_id}")
+async def get_generation(run_id: str):
+    return await find_generation(run_id)
+
+@app.get("/generate/runs/{run_id}/events")
+async def generation_events(run_id: str):
+    run = runs.get_run(run_id)
+    if run:
+        return StreamingResponse(run.channel.stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    # Started by another worker: its progress isn't shared, only where it stands
+    status = await find_generation(run_id)
+
+    async def snapshot():
+        yield format_sse("finished" if status["status"] != "running" else "running", status)
+
+    return StreamingResponse(snapshot(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/generate/runs/{run_id}/download")
+async def download_generation(run_id: str):
+    status = await find_generation(run_id)
+    if status["status"] == "failed":
+        raise HTTPException(status_code=status["error_status"] or 500, detail=status["error"])
+    if status["status"] != "done":
+        raise HTTPException(status_code=409, detail="Generation is still running")
+    deck = await run_in_threadpool(runs.get_deck, run_id)
+    if deck is None:
+        raise HTTPException(status_code=410, detail="Generated deck has expired, please generate again")
+    headers = {
+        'Content-Disposition': f'attachment; filename="{status["filename"]}"'
+    }
+    return Response(content=deck, media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation", headers=headers)
+
+@app.post("/preview")
+async def preview_ppt(request: GenerateRequest, format: str = "png", width: int = 960):
+    """
+    Renders a lightweight preview of the deck. PNG previews return one hash per slide,
+    fetch the images from /preview/slides/{hash}.png. Unchanged slides are not re-rendered.
+    """
+    if format not in ("png", "pdf"):
+        raise HTTPException(status_code=400, detail="format must be 'png' or 'pdf'")
+    width = max(160, min(width, 1920))
+    from .generator import build_presentation
+    from .preview import render_deck_pngs, render_deck_pdf
+    await check_template(request)
+    request, assets = await apply_church_profile(request)
+
     try:
-        ppt_file = generate_powerpoint(request)
-        headers = {
-            'Content-Disposition': f'attachment; filename="Service_{request.date}.pptx"'
-        }
-        return Response(content=ppt_file.getvalue(), media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation", headers=headers)
+        prs = await run_in_threadpool(run_with_priority, Priority.GENERATE, build_presentation, request, assets)
+        if format == "pdf":
+            pdf, rendered = await run_in_threadpool(render_deck_pdf, prs, width)
+            headers = {
+                'Content-Disposition': f'inline; filename="Service_{request.date}.pdf"',
+                'X-Slides-Rendered': str(rendered),
+            }
+            return Response(content=pdf, media_type="application/pdf", headers=headers)
+
+        slide_pngs = await run_in_threadpool(render_deck_pngs, prs, width)
     except Exception as e:
-        print(f"Error generating PPT: {e}")
+        print(f"Error rendering preview: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {
+        "slides": [
+            {"index": i, "hash": key, "url": f"/preview/slides/{key}.png"}
+            for i, (key, _, _) in enumerate(slide_pngs)
+        ],
+        "rendered": sum(1 for _, _, was_cached in slide_pngs if not was_cached),
+        "cached": sum(1 for _, _, was_cached in slide_pngs if was_cached),
+    }
+
+@app.get("/preview/slides/{slide_hash}.png")
+async def get_preview_slide(slide_hash: str):
+    from .preview import get_cached_png
+    png = get_cached_png(slide_hash) if slide_hash.isalnum() else None
+    if png is None:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    # Content addressed, so browsers may keep it forever
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/plans", response_model=List[ServicePlan])
+async def get_plans():
+    plans = await db.plans.find({}).sort("date", -1).to_list(length=None)
+    return [ServicePlan(**plan) for plan in plans]
+
+@app.get("/plans/{plan_id}", response_model=ServicePlan)
+async def get_plan(plan_id: str):
+    plan = await db.plans.find_one({"id": plan_id})
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    return ServicePlan(**plan)
+
+@app.post("/plans", response_model=ServicePlan)
+async def create_plan(plan: ServicePlan):
+    if not plan.id:
+        plan.id = str(uuid.uuid4())
+
+    # Unset fields stay unset so a church profile can still fill them in
+    try:
+        await db.plans.insert_one(plan.dict(exclude_unset=True))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"A plan with id {plan.id} already exists")
+    return plan
+
+@app.put("/plans/{plan_id}", response_model=ServicePlan)
+async def update_plan(plan_id: str, updated_plan: ServicePlan):
+    updated_plan.id = plan_id
+
+    result = await db.plans.replace_one({"id": plan_id}, updated_plan.dict(exclude_unset=True))
+
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Plan not found")
+
+    return updated_plan
+
+@app.delete("/plans/{plan_id}")
+async def delete_plan(plan_id: str):
+    result = await db.plans.delete_one({"id": plan_id})
+
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Plan not found")
+
+    return {"message": "Plan deleted"}
+
+@app.post("/plans/{plan_id}/generate")
+async def generate_ppt_from_plan(plan_id: str):
+    plan = await db.plans.find_one({"id": plan_id})
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
+
+    request = await build_generate_request(ServicePlan(**plan))
+    return await build_pptx_response(request)
+
+@app.get("/templates", response_model=List[TemplateInfo])
+async def get_templates():
+    from .templates_index import get_template_manifest
+    manifest = await run_in_threadpool(get_template_manifest)
+    return list(manifest.values())
+
+# Left out of the listing, so a profile saved back from it must not clear them
+CHURCH_IMAGE_FIELDS = {"logo", "tithing_images"}
+
+@app.get("/churches", response_model=List[ChurchProfile], response_model_exclude={"__all__": CHURCH_IMAGE_FIELDS})
+async def get_churches():
+    # Images are only needed when generating, keep the listing light
+    churches = await db.churches.find({}, {"logo": 0, "tithing_images": 0}).to_list(length=None)
+    return [ChurchProfile(**church) for church in churches]
+
+@app.get("/churches/{church_id}", response_model=ChurchProfile)
+async def get_church_profile(church_id: str):
+    church = await db.churches.find_one({"id": church_id})
+    if not church:
+        raise HTTPException(status_code=404, detail="Church not found")
+    return ChurchProfile(**church)
+
+@app.post("/churches", response_model=ChurchProfile)
+async def create_church(church: ChurchProfile):
+    if not church.id:
+        church.id = str(uuid.uuid4())
+    church.revision = 1
+
+    try:
+        await db.churches.insert_one(church.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"A church with id {church.id} already exists")
+    return church
+
+@app.put("/churches/{church_id}", response_model=ChurchProfile)
+async def update_church(church_id: str, updated_church: ChurchProfile):
+    updated_church.id = church_id
+
+    existing = await db.churches.find_one({"id": church_id}, {"revision": 1, **{field: 1 for field in CHURCH_IMAGE_FIELDS}})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Church not found")
+    # Keep the stored images unless the body actually sends new ones
+    sent = updated_church.dict(exclude_unset=True)
+    for field in CHURCH_IMAGE_FIELDS:
+        if field not in sent and field in existing:
+            setattr(updated_church, field, existing[field])
+    # A new revision tells every worker to re-process the images
+    updated_church.revision = existing.get("revision", 1) + 1
+
+    await db.churches.replace_one({"id": church_id}, updated_church.dict())
+    forget_church(church_id)
+    return updated_church
+
+@app.delete("/churches/{church_id}")
+async def delete_church(church_id: str):
+    result = await db.churches.delete_one({"id": church_id})
+
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Church not found")
+
+    forget_church(church_id)
+    return {"message": "Church deleted"}
+
+@app.get("/metrics/outbound")
+async def outbound_metrics():
+    """Per-provider quota usage and how long calls waited in the outbound queue."""
+    return outbound.stats()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Hit/miss counts, size and evictions for every cache this worker has used."""
+    from .cache import cache_stats
+    return await run_in_threadpool(cache_stats)
+
 @app.get("/health")
 async def health_check():
     try:
         # Ping the DB to check connection
         await db.command("ping")
-        return {"status": "ok", "database": "connected"}
+        return {"status": "ok", "database": "connected", "pool": database.pool_report(), "startup": startup_report}
     except Exception as e:
         print(f"Health check failed: {e}")
-        return {"status": "error", "database": str(e)}
+        return {"status": "error", "database": str(e), "pool": database.pool_report(), "startup": startup_report}
+
+startup_report["import_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+startup_report["import_budget_ms"] = IMPORT_BUDGET_MS
+if startup_report["import_ms"] > IMPORT_BUDGET_MS:
+    print(f"Importing app.main took {startup_report['import_ms']}ms, over the {IMPORT_BUDGET_MS}ms budget")
@@ -1,9 +1,10 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, validator
+from typing import Dict, List, Optional
 
 class SongSection(BaseModel):
     label: str
-    content: str
+    content: str = ""
+    ref: Optional[str] = None # label of an earlier section this one repeats, e.g. "Chorus"
 
 class Song(BaseModel):
     id: Optional[str] = None
@@ -11,8 +12,35 @@ class Song(BaseModel):
     artist: Optional[str] = None
     ccli_number: Optional[str] = None
     sections: List[SongSection]
+    arrangement: Optional[List[str]] = None # section labels in sung order, defaults to the sections' order
+    # Bumped on every update so saved plans and caches can tell edits apart
+    revision: int = 1
     # We can add more fields later like 'author', 'key', etc.
 
+    # A typo in a ref or the arrangement would silently drop a chorus from the deck
+    @validator("sections")
+    def refs_point_backwards(cls, sections):
+        seen = set()
+        for section in sections:
+            if section.ref and section.ref not in seen:
+                raise ValueError(f"Section '{section.label}' repeats '{section.ref}', which is not an earlier section")
+            seen.add(section.label)
+        return sections
+
+    @validator("arrangement")
+    def arrangement_labels_exist(cls, arrangement, values):
+        if "sections" not in values:
+            return arrangement # already reported by the sections check
+        labels = {section.label for section in values["sections"]}
+        unknown = [label for label in arrangement or [] if label not in labels]
+        if unknown:
+            raise ValueError(f"Arrangement lists unknown sections: {', '.join(unknown)}")
+        return arrangement
+
+class SongRef(BaseModel):
+    id: str
+    revision: Optional[int] = None # None follows the latest revision
+
 class ServiceItem(BaseModel):
     type: str  # "song", "bible", "announcement", "communion"
     id: Optional[str] = None # ID if it's a song from DB
@@ -33,19 +61,72 @@ class OfferingInfo(BaseModel):
     reference: str = "offering"
     details: str = "The offering box is available at the back of the hall"
 
-class GenerateRequest(BaseModel):
+class ChurchProfile(BaseModel):
+    id: Optional[str] = None
+    name: str
+    service_name: str = "English Service"
+    service_time: str = "9:45 – 11:00 am"
+    offering: OfferingInfo = OfferingInfo()
+    template_name: Optional[str] = "medium"
+    default_language: str = "Chinese (Simplified)"
+    logo: Optional[str] = None # base64 encoded image
+    # base64 encoded images keyed by offering slot: church, account_number, bsb, hands, box
+    tithing_images: Dict[str, str] = {}
+    revision: int = 1
+
+class ServiceDetails(BaseModel):
     date: str
     speaker: str
     topic: str
+    church_id: Optional[str] = None # fills in anything below that isn't sent
     church_name: str = "Blacktown Chinese Christian Church"
     service_name: str = "English Service"
+    service_time: str = "9:45 – 11:00 am"
     bible_readings: List[BibleReading] = []
-    songs: List[Song]
-    response_songs: List[Song]
     announcements: List[AnnouncementItem] = []
     offering: OfferingInfo = OfferingInfo()
     prayer_points: List[str] = []
     mingle_text: str = "Mingle time!"
-    template_name: Optional[str] = "medium"
+    template_name: Optional[str] = "medium" # size class: small, medium or large
+    template_id: Optional[str] = None # pick an exact template, see GET /templates
+    template_seed: Optional[str] = None # same seed, same template (defaults to the date)
     translate: bool = False
     language: str = "Chinese (Simplified)"
+
+class GenerateRequest(ServiceDetails):
+    songs: List[Song]
+    response_songs: List[Song]
+
+class ServicePlan(ServiceDetails):
+    id: Optional[str] = None
+    songs: List[SongRef] = []
+    response_songs: List[SongRef] = []
+
+class TemplateInfo(BaseModel):
+    id: str
+    path: str
+    size: str
+    fonts: Dict[str, int]
+    blank_layout: int
+    slide_width: int
+    slide_height: int
+
+class SetlistItem(BaseModel):
+    title: str
+    artist: Optional[str] = ""
+    ccli_number: Optional[str] = None
+
+class SetlistImportRequest(BaseModel):
+    songs: List[SetlistItem] = []
+    setlist: Optional[str] = None # raw text, one song per line (CCLI-style export)
+
+class ImportItem(SetlistItem):
+    status: str = "pending" # pending, fetched, done, skipped, failed
+    song_id: Optional[str] = None
+    lyrics: Optional[str] = None # kept once fetched so a resume skips Genius
+    error: Optional[str] = None
+
+class ImportJob(BaseModel):
+    id: str
+    status: str = "running" # running, done, failed
+    items: List[ImportItem] = []
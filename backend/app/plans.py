@@ -0,0 +1,49 @@
+from typing import Dict, List
+
+from fastapi import HTTPException
+
+from .models import Song, SongRef, ServicePlan, GenerateRequest
+from .database import db
+from .song_codec import unpack_song
+
+async def resolve_song_refs(refs: List[SongRef]) -> List[Song]:
+    """
+    Loads the songs a plan points at with a single batched $in query.
+    Order (and repeats) of the refs are preserved.
+    """
+    if not refs:
+        return []
+
+    ids = list(dict.fromkeys(ref.id for ref in refs))
+    cursor = db.songs.find({"id": {"$in": ids}})
+    docs = await cursor.to_list(length=None)
+    songs_by_id: Dict[str, Song] = {doc["id"]: Song(**unpack_song(doc)) for doc in docs}
+
+    missing = [song_id for song_id in ids if song_id not in songs_by_id]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Songs not found: {', '.join(missing)}")
+
+    songs = []
+    for ref in refs:
+        song = songs_by_id[ref.id]
+        # A pinned revision must still be the one in the library
+        if ref.revision is not None and ref.revision != song.revision:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Song '{song.title}' is at revision {song.revision}, plan expects {ref.revision}"
+            )
+        songs.append(song)
+    return songs
+
+async def build_generate_request(plan: ServicePlan) -> GenerateRequest:
+    """Turns a saved plan into the full request the generator understands."""
+    # Resolve both sets in one round trip
+    all_songs = await resolve_song_refs(plan.songs + plan.response_songs)
+    # Leave unset fields out so church profile defaults still apply later
+    details = plan.dict(exclude={"id", "songs", "response_songs"}, exclude_unset=True)
+
+    return GenerateRequest(
+        **details,
+        songs=all_songs[:len(plan.songs)],
+        response_songs=all_songs[len(plan.songs):],
+    )
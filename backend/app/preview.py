@@ -0,0 +1,189 @@
+import hashlib
+import io
+import os
+from functools import cache
+from typing import List, Optional, Tuple
+
+from lxml import etree
+from PIL import Image, ImageDraw, ImageFont
+from pptx.enum.dml import MSO_FILL
+from pptx.enum.shapes import MSO_SHAPE_TYPE, MSO_SHAPE
+from pptx.enum.text import PP_ALIGN
+from pptx.util import Pt
+
+from .cache import Cache, get_cache
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bump when the rasterizer changes so old thumbnails are not reused
+PREVIEW_FORMAT_VERSION = 1
+
+DEFAULT_FONT_SIZE = Pt(18)
+# python-pptx text frames default to 0.1" left/right and 0.05" top/bottom insets
+TEXT_INSET_X = 91440
+TEXT_INSET_Y = 45720
+FALLBACK_FILL = (217, 217, 217)
+
+@cache
+def get_preview_store() -> Cache:
+    directory = os.environ.get("PREVIEW_CACHE_DIR", os.path.join(BACKEND_DIR, ".cache", "previews"))
+    max_mb = int(os.environ.get("PREVIEW_CACHE_MAX_MB", "128"))
+    return get_cache("previews", max_mb, default="disk", directory=directory)
+
+@cache
+def load_font(size_px: int, bold: bool = False):
+    """Uses PREVIEW_FONT (e.g. a CJK font for translated decks) if set, then common system fonts."""
+    candidates = [os.environ.get("PREVIEW_FONT")]
+    candidates += ["DejaVuSans-Bold.ttf", "Arial Bold.ttf"] if bold else ["DejaVuSans.ttf", "Arial.ttf"]
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            return ImageFont.truetype(candidate, size_px)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size_px)
+
+def slide_content_hash(slide, prs, width: int) -> str:
+    """Identifies what a slide will look like, so unchanged slides reuse their thumbnail."""
+    digest = hashlib.sha256()
+    digest.update(f"{PREVIEW_FORMAT_VERSION}:{width}:{prs.slide_width}:{prs.slide_height}".encode())
+    digest.update(etree.tostring(slide.shapes._spTree))
+    # Pictures are referenced by relationship id, so hash the image bytes too
+    for shape in slide.shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+            digest.update(shape.image.sha1.encode())
+    return digest.hexdigest()
+
+def shape_fill_colour(shape) -> Optional[Tuple[int, int, int]]:
+    try:
+        if shape.fill.type != MSO_FILL.SOLID:
+            return None
+    except Exception:
+        return None
+    try:
+        rgb = shape.fill.fore_color.rgb
+        return (rgb[0], rgb[1], rgb[2])
+    except Exception:
+        # Theme colours can't be resolved without the theme, use a neutral grey
+        return FALLBACK_FILL
+
+def paragraph_style(paragraph):
+    """Reads the size, weight and colour set on a paragraph or its first run."""
+    fonts = [paragraph.font] + [run.font for run in paragraph.runs[:1]]
+    size = next((f.size for f in reversed(fonts) if f.size), DEFAULT_FONT_SIZE)
+    bold = any(f.bold for f in fonts)
+    colour = (0, 0, 0)
+    for f in fonts:
+        try:
+            rgb = f.color.rgb
+            if rgb is not None:
+                colour = (rgb[0], rgb[1], rgb[2])
+        except Exception:
+            pass
+    return size, bold, colour
+
+def wrap_line(draw, text: str, font, max_width: float) -> List[str]:
+    words = text.split(" ")
+    lines = []
+    current = ""
+    for word in words:
+        candidate = f"{current} {word}" if current else word
+        if current and draw.textlength(candidate, font=font) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    lines.append(current)
+    return lines
+
+def draw_text_frame(draw, shape, scale: float):
+    left = (shape.left + TEXT_INSET_X) * scale
+    top = (shape.top + TEXT_INSET_Y) * scale
+    box_width = max((shape.width - 2 * TEXT_INSET_X) * scale, 1)
+
+    y = top
+    for paragraph in shape.text_frame.paragraphs:
+        size, bold, colour = paragraph_style(paragraph)
+        size_px = max(int(size * scale), 1)
+        font = load_font(size_px, bold)
+        line_height = size_px * 1.2
+
+        # Soft line breaks come through as vertical tabs
+        for raw_line in paragraph.text.replace("\x0b", "\n").split("\n"):
+            for line in wrap_line(draw, raw_line, font, box_width):
+                line_width = draw.textlength(line, font=font)
+                if paragraph.alignment == PP_ALIGN.CENTER:
+                    x = left + (box_width - line_width) / 2
+                elif paragraph.alignment == PP_ALIGN.RIGHT:
+                    x = left + box_width - line_width
+                else:
+                    x = left
+                draw.text((x, y), line, font=font, fill=colour)
+                y += line_height
+
+def render_slide(slide, prs, width: int) -> Image.Image:
+    """Rasterizes the shapes the generator places: pictures, filled boxes and text."""
+    scale = width / prs.slide_width
+    height = int(prs.slide_height * scale)
+    image = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+
+    for shape in slide.shapes:
+        if shape.left is None or shape.width is None:
+            continue
+        box = [shape.left * scale, shape.top * scale,
+               (shape.left + shape.width) * scale, (shape.top + shape.height) * scale]
+
+        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+            try:
+                picture = Image.open(io.BytesIO(shape.image.blob)).convert("RGBA")
+                picture = picture.resize((max(int(box[2] - box[0]), 1), max(int(box[3] - box[1]), 1)))
+                image.paste(picture, (int(box[0]), int(box[1])), picture)
+            except Exception as e:
+                print(f"Preview could not draw picture: {e}")
+            continue
+
+        if shape.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE:
+            fill = shape_fill_colour(shape)
+            if fill:
+                if shape.auto_shape_type == MSO_SHAPE.ROUNDED_RECTANGLE:
+                    draw.rounded_rectangle(box, radius=(box[3] - box[1]) * 0.15, fill=fill)
+                else:
+                    draw.rectangle(box, fill=fill)
+
+        if shape.has_text_frame and shape.text_frame.text.strip():
+            draw_text_frame(draw, shape, scale)
+
+    return image
+
+def get_slide_png(slide, prs, width: int) -> Tuple[str, bytes, bool]:
+    """Returns (hash, png bytes, was_cached) for a slide."""
+    key = slide_content_hash(slide, prs, width)
+    store = get_preview_store()
+    cached = store.get(key)
+    if cached is not None:
+        return key, cached, True
+
+    output = io.BytesIO()
+    render_slide(slide, prs, width).save(output, format="PNG", optimize=True)
+    png = output.getvalue()
+    store.put(key, png)
+    return key, png, False
+
+def get_cached_png(key: str) -> Optional[bytes]:
+    return get_preview_store().get(key)
+
+def render_deck_pngs(prs, width: int) -> List[Tuple[str, bytes, bool]]:
+    return [get_slide_png(slide, prs, width) for slide in prs.slides]
+
+def render_deck_pdf(prs, width: int) -> Tuple[bytes, int]:
+    """One PDF page per slide. Also returns how many slides had to be rendered."""
+    slide_pngs = render_deck_pngs(prs, width)
+    images = [Image.open(io.BytesIO(png)).convert("RGB") for _, png, _ in slide_pngs]
+
+    output = io.BytesIO()
+    if images:
+        images[0].save(output, format="PDF", save_all=True, append_images=images[1:])
+    rendered = sum(1 for _, _, was_cached in slide_pngs if not was_cached)
+    return output.getvalue(), rendered
@@ -0,0 +1,73 @@
+import os
+import threading
+from typing import Any, Callable, Dict
+
+from . import config  # noqa: F401 - makes sure API keys are in the environment
+
+# Outbound clients are expensive to import and construct, so they are only
+# created the first time something asks for them.
+_factories: Dict[str, Callable[[], Any]] = {}
+_instances: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+def register_provider(name: str, factory: Callable[[], Any]):
+    with _lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+
+def override_provider(name: str, instance: Any):
+    """Swaps in a ready-made client, e.g. a fake for tests or load tests."""
+    with _lock:
+        _instances[name] = instance
+
+def reset_providers():
+    with _lock:
+        _instances.clear()
+
+def get_provider(name: str) -> Any:
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"Unknown provider: {name}")
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+def is_loaded(name: str) -> bool:
+    return name in _instances
+
+def _gemini_client():
+    # uses GEMINI_API_KEY from the .env file
+    from google import genai
+    return genai.Client()
+
+def _genius_client():
+    import lyricsgenius
+    # Increase timeout if it isn't working
+    genius = lyricsgenius.Genius(os.environ.get("GENIUS_TOKEN"), timeout=100)
+    # We WANT section headers [Verse 1] etc. to help Gemini structure it
+    genius.remove_section_headers = False
+    genius.skip_non_songs = True
+    return genius
+
+def _google_translate():
+    from deep_translator import GoogleTranslator
+
+    def translate(text: str, target: str) -> str:
+        return GoogleTranslator(source='auto', target=target).translate(text)
+    return translate
+
+def _bible_extractor():
+    from meaningless import WebExtractor
+
+    def extractor_for(translation: str):
+        return WebExtractor(translation=translation, output_as_list=True)
+    return extractor_for
+
+register_provider("gemini", _gemini_client)
+register_provider("genius", _genius_client)
+register_provider("google_translate", _google_translate)
+register_provider("bible_extractor", _bible_extractor)
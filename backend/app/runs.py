@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from .models import GenerateRequest
+from .churches import apply_church_profile
+from .events import ProgressChannel
+from .cache import Cache, get_cache
+from .scheduler import Priority, run_with_priority
+
+# How long a finished run's status and progress history are kept for late listeners
+RUN_TTL_S = float(os.environ.get("GENERATION_RUN_TTL_S", "600"))
+# A run another worker still lists as running after this long was interrupted (e.g. a restart)
+RUN_MAX_S = float(os.environ.get("GENERATION_RUN_MAX_S", "900"))
+DECK_CACHE_MAX_MB = int(os.environ.get("DECK_CACHE_MAX_MB", "256"))
+
+def get_deck_cache() -> Cache:
+    """Finished decks, shared between workers when CACHE_BACKEND is sqlite or redis."""
+    return get_cache("decks", DECK_CACHE_MAX_MB)
+
+def get_record_cache() -> Cache:
+    """Status of every run, so other workers can join it or report how it ended."""
+    return get_cache("runs", 4)
+
+def run_summary(run_id: str, status: str, error: Optional[str] = None, error_status: Optional[int] = None) -> dict:
+    return {
+        "id": run_id,
+        "status": status,
+        "events_url": f"/generate/runs/{run_id}/events",
+        "download_url": f"/generate/runs/{run_id}/download",
+        "error": error,
+        # HTTP status of the failure, e.g. 404 for an unknown church, so downloads can report it
+        "error_status": error_status,
+    }
+
+class GenerationRun:
+    """One deck being built in this process and its progress. The file goes to the "decks" cache."""
+
+    def __init__(self, run_id: str, request: GenerateRequest):
+        self.id = run_id
+        self.request = request
+        self.status = "running"
+        self.channel = ProgressChannel()
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.started = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.started_at = time.time()
+
+    @property
+    def filename(self) -> str:
+        return f"Service_{self.request.date}.pptx"
+
+    def summary(self) -> dict:
+        return {**run_summary(self.id, self.status, self.error, self.error_status), "filename": self.filename}
+
+    def save_record(self):
+        record = {
+            "status": self.status,
+            "error": self.error,
+            "error_status": self.error_status,
+            "filename": self.filename,
+            "started_at": self.started_at,
+        }
+        get_record_cache().put(self.id, json.dumps(record).encode("utf-8"))
+
+# Keyed by request hash, so resubmitting the same service attaches to its run
+_runs: Dict[str, GenerationRun] = {}
+_tasks = set()
+
+def request_hash(request: GenerateRequest) -> str:
+    payload = json.dumps(request.dict(), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+def forget_expired():
+    now = time.monotonic()
+    expired = [run_id for run_id, run in _runs.items() if run.finished_at and now - run.finished_at > RUN_TTL_S]
+    for run_id in expired:
+        _runs.pop(run_id, None)
+
+def get_run(run_id: str) -> Optional[GenerationRun]:
+    forget_expired()
+    return _runs.get(run_id)
+
+def load_record(run_id: str) -> Optional[dict]:
+    data = get_record_cache().get(run_id)
+    if data is None:
+        return None
+    record = json.loads(data)
+    if record["status"] == "running" and time.time() - record["started_at"] > RUN_MAX_S:
+        record.update(status="failed", error="Generation was interrupted, please try again", error_status=503)
+    return record
+
+async def run_status(run_id: str) -> Optional[dict]:
+    """Summary of a run started by any worker, or None if there is no such run."""
+    run = get_run(run_id)
+    if run:
+        return run.summary()
+    record = await run_in_threadpool(load_record, run_id)
+    if record is None:
+        return None
+    summary = run_summary(run_id, record["status"], record["error"], record.get("error_status"))
+    return {**summary, "filename": record["filename"]}
+
+def get_deck(run_id: str) -> Optional[bytes]:
+    # Works for runs started by other workers too, as long as the cache is shared
+    return get_deck_cache().get(run_id)
+
+async def generate_deck(request: GenerateRequest, progress=None) -> bytes:
+    """Applies the church profile and builds the deck. Shared by POST /generate and background runs."""
+    from .generator import generate_powerpoint
+
+    request, assets = await apply_church_profile(request)
+    try:
+        # Someone is waiting on this deck, so its translations jump the outbound queue
+        output = await run_in_threadpool(run_with_priority, Priority.GENERATE, generate_powerpoint, request, assets, progress)
+    except Exception as e:
+        print(f"Error generating PPT: {e}")
+        raise
+    return output.getvalue()
+
+async def start_run(request: GenerateRequest) -> dict:
+    """Starts building the deck, or joins the run (on any worker) still building the same request."""
+    run_id = request_hash(request)
+    # Finished runs are not reused: a retry may be after translations that fell back
+    # to the original text, and the caches below already make an identical rebuild cheap
+    existing = await run_status(run_id)
+    if existing and existing["status"] == "running":
+        return existing
+
+    run = GenerationRun(run_id, request)
+    _runs[run_id] = run
+    await run_in_threadpool(run.save_record)
+    task = asyncio.create_task(execute(run))
+    # Keep a reference so the task isn't garbage collected mid-run
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return run.summary()
+
+async def execute(run: GenerationRun):
+    def progress(stage: str, data: dict):
+        # Called from the worker thread, publish() hands it back to the event loop
+        run.channel.publish("stage", {"stage": stage, **data})
+
+    request = run.request
+    run.channel.publish("started", {
+        "id": run.id,
+        "songs": len(request.songs),
+        "readings": len(request.bible_readings),
+        "response_songs": len(request.response_songs),
+    })
+    try:
+        content = await generate_deck(request, progress)
+        await run_in_threadpool(get_deck_cache().put, run.id, content)
+        run.status = "done"
+    except asyncio.CancelledError:
+        # Shutting down, so other workers don't wait on a deck that will never come
+        run.status = "failed"
+        run.error = "Generation was interrupted, please try again"
+        run.error_status = 503
+        run.channel.publish("error", {"detail": run.error})
+        raise
+    except Exception as e:
+        run.status = "failed"
+        # HTTPException (e.g. an unknown church) keeps its message in detail and its code
+        run.error = str(getattr(e, "detail", e))
+        run.error_status = getattr(e, "status_code", 500)
+        run.channel.publish("error", {"detail": run.error})
+    finally:
+        await run_in_threadpool(run.save_record)
+        run.finished_at = time.monotonic()
+        total_ms = round((time.perf_counter() - run.started) * 1000, 1)
+        run.channel.publish("finished", {**run.summary(), "total_ms": total_ms})
+        run.channel.close()
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from itertools import count
+from typing import Any, Callable, Dict
+
+class Priority(IntEnum):
+    """Lower numbers are served first when a provider's quota is contended."""
+    GENERATE = 0     # a volunteer is waiting on a deck
+    INTERACTIVE = 1  # searches and Bible lookups from the UI
+    BACKGROUND = 2   # imports and pre-translation
+
+_current_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.INTERACTIVE)
+
+@contextmanager
+def priority(level: Priority):
+    """Outbound calls made inside this block are queued at the given priority."""
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def run_with_priority(level: Priority, fn: Callable, *args, **kwargs):
+    """For handing work to a thread pool while keeping its priority."""
+    with priority(level):
+        return fn(*args, **kwargs)
+
+class OutboundQueueTimeout(Exception):
+    pass
+
+def is_rate_limited(error: Exception) -> bool:
+    message = str(error).lower()
+    return "429" in message or "resource_exhausted" in message or "rate limit" in message or "too many requests" in message
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until_available(self, now: float) -> float:
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Upstream said slow down: stop handing out tokens for a while."""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated = now
+
+class ProviderLimiter:
+    """A token bucket plus a priority queue of threads waiting for it."""
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, max_wait: float):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = count()
+        self.calls = 0
+        self.rate_limited = 0
+        self.timeouts = 0
+        self.waits = {level.name.lower(): {"count": 0, "total_ms": 0.0, "max_ms": 0.0} for level in Priority}
+
+    def acquire(self, level: Priority):
+        entry = (int(level), next(self._sequence))
+        started = time.monotonic()
+        deadline = started + self.max_wait
+
+        with self._condition:
+            self._waiters.append(entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if now >= deadline:
+                        self.timeouts += 1
+                        raise OutboundQueueTimeout(f"Waited over {self.max_wait}s for {self.name} quota")
+
+                    # Only the most urgent waiter (FIFO within a priority) may take a token
+                    if entry == min(self._waiters):
+                        wait = self.bucket.seconds_until_available(now)
+                        if wait <= 0:
+                            self.bucket.take()
+                            self.calls += 1
+                            break
+                        self._condition.wait(timeout=min(wait, deadline - now))
+                    else:
+                        self._condition.wait(timeout=deadline - now)
+            finally:
+                self._waiters.remove(entry)
+                self._condition.notify_all()
+
+            waited_ms = (time.monotonic() - started) * 1000
+            stats = self.waits[level.name.lower()]
+            stats["count"] += 1
+            stats["total_ms"] += waited_ms
+            stats["max_ms"] = max(stats["max_ms"], waited_ms)
+
+    def record_rate_limited(self, backoff: float):
+        with self._condition:
+            self.rate_limited += 1
+            self.bucket.pause(backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "rate_per_minute": self.bucket.rate * 60,
+                "burst": self.bucket.capacity,
+                "queued": len(self._waiters),
+                "calls": self.calls,
+                "rate_limited": self.rate_limited,
+                "timeouts": self.timeouts,
+                "wait": {
+                    name: {
+                        "count": s["count"],
+                        "avg_ms": round(s["total_ms"] / s["count"], 1) if s["count"] else 0.0,
+                        "max_ms": round(s["max_ms"], 1),
+                    }
+                    for name, s in self.waits.items()
+                },
+            }
+
+class OutboundScheduler:
+    """Central gate for calls to rate limited upstreams (Gemini, Genius)."""
+
+    def __init__(self, max_retries: int = 2, backoff: float = 5.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider: str) -> ProviderLimiter:
+        with self._lock:
+            if provider not in self._limiters:
+                prefix = provider.upper()
+                self._limiters[provider] = ProviderLimiter(
+                    provider,
+                    rate_per_minute=float(os.environ.get(f"{prefix}_RATE_PER_MIN", "60")),
+                    burst=int(os.environ.get(f"{prefix}_BURST", "5")),
+                    max_wait=float(os.environ.get("OUTBOUND_MAX_WAIT_S", "60")),
+                )
+            return self._limiters[provider]
+
+    def call(self, provider: str, fn: Callable, *args, **kwargs):
+        """
+        Runs fn once the provider's quota allows it. Rate limited responses pause the
+        provider for everyone and are retried, instead of surfacing as silent fallbacks.
+        """
+        limiter = self.limiter(provider)
+        level = _current_priority.get()
+
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire(level)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == self.max_retries:
+                    raise
+                print(f"{provider} rate limited, backing off (attempt {attempt + 1})")
+                limiter.record_rate_limited(self.backoff * (2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.name: limiter.stats() for limiter in limiters}
+
+outbound = OutboundScheduler()
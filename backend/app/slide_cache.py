@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+from functools import cache
+from typing import List, Optional
+
+from lxml import etree
+from pptx.oxml import parse_xml
+
+from .models import Song
+from .blob_store import GridFSBlobStore, TieredBlobStore
+from .cache import get_cache
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bump when the way songs are rendered changes so stale blocks are ignored
+BLOCK_FORMAT_VERSION = 1
+
+def slide_cache_enabled() -> bool:
+    return os.environ.get("SLIDE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+@cache
+def get_block_store():
+    """The "slides" cache (local disk by default), optionally backed by a shared GridFS tier."""
+    directory = os.environ.get("SLIDE_CACHE_DIR", os.path.join(BACKEND_DIR, ".cache", "slides"))
+    max_mb = int(os.environ.get("SLIDE_CACHE_MAX_MB", "256"))
+    stores = [get_cache("slides", max_mb, default="disk", directory=directory)]
+
+    if os.environ.get("SLIDE_CACHE_GRIDFS", "").lower() in ("1", "true", "yes"):
+        try:
+            stores.append(GridFSBlobStore(
+                os.environ.get("MONGODB_URI", "mongodb://localhost:27017"),
+                os.environ.get("DB_NAME", "ppt_maker"),
+                "slide_blocks",
+            ))
+        except Exception as e:
+            print(f"GridFS slide cache unavailable: {e}")
+
+    return TieredBlobStore(stores)
+
+def song_block_key(song: Song, prs, title_size, font_size, translate: bool, language: str) -> str:
+    """
+    Hashes everything that affects a song's rendered slides. The song's own content
+    is part of the key, so editing a song produces a new key instead of a stale hit.
+    """
+    payload = {
+        "version": BLOCK_FORMAT_VERSION,
+        "song": song.dict(exclude={"id", "revision"}),
+        "slide_size": [prs.slide_width, prs.slide_height],
+        "title_size": title_size,
+        "font_size": font_size,
+        "translate": translate,
+        "language": language if translate else None,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def get_song_block(key: str) -> Optional[List[List[str]]]:
+    if not slide_cache_enabled():
+        return None
+    try:
+        data = get_block_store().get(key)
+        return json.loads(data) if data is not None else None
+    except Exception as e:
+        print(f"Slide cache read failed: {e}")
+        return None
+
+def serialize_slide_shapes(slide) -> List[str]:
+    """Everything on the slide except the placeholders it inherited from its layout."""
+    return [
+        etree.tostring(shape_elm, encoding="unicode")
+        for shape_elm in slide.shapes._spTree.iter_shape_elms()
+        if not shape_elm.has_ph_elm
+    ]
+
+def put_song_block(key: str, slides):
+    if not slide_cache_enabled():
+        return
+    try:
+        block = [serialize_slide_shapes(slide) for slide in slides]
+        get_block_store().put(key, json.dumps(block).encode("utf-8"))
+    except Exception as e:
+        print(f"Slide cache write failed: {e}")
+
+def fill_slide(slide, shapes_xml: List[str]):
+    """Copies previously rendered shapes onto a freshly added slide."""
+    sp_tree = slide.shapes._spTree
+    for shape_xml in shapes_xml:
+        shape_elm = parse_xml(shape_xml)
+        # Renumber so ids never clash with this slide's own placeholders
+        shape_elm.xpath("./*[1]/p:cNvPr")[0].set("id", str(sp_tree.max_shape_id + 1))
+        sp_tree.insert_element_before(shape_elm, "p:extLst")
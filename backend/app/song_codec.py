@@ -0,0 +1,68 @@
+import os
+import zlib
+from typing import Dict, List
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Opt in with SONG_STORAGE=packed. Either way both layouts can be read,
+# so switching back and forth never strands existing songs.
+def storage_mode() -> str:
+    return os.environ.get("SONG_STORAGE", "plain").lower()
+
+def compress(data: bytes) -> tuple:
+    if zstandard is not None:
+        return "lines-zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "lines-zlib", zlib.compress(data, 9)
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "lines-zstd":
+        if zstandard is None:
+            raise RuntimeError("Song is zstd packed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "lines-zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown song codec: {codec}")
+
+def pack_song(doc: dict) -> dict:
+    """
+    Stores each distinct lyric line once per song. Sections keep their other
+    fields and list line numbers instead of content, so a repeated chorus costs
+    a few integers. Title, artist, id etc. stay plain so they can be queried.
+    """
+    line_numbers: Dict[str, int] = {}
+    sections = []
+    for section in doc.get("sections", []):
+        packed_section = {k: v for k, v in section.items() if k != "content"}
+        packed_section["lines"] = [
+            line_numbers.setdefault(line, len(line_numbers))
+            for line in (section.get("content") or "").split("\n")
+        ]
+        sections.append(packed_section)
+
+    codec, blob = compress("\n".join(line_numbers).encode("utf-8"))
+    packed = {k: v for k, v in doc.items() if k != "sections"}
+    packed["packed"] = {"codec": codec, "lines": blob, "sections": sections}
+    return packed
+
+def unpack_song(doc: dict) -> dict:
+    """Returns the plain layout whether or not the stored document was packed."""
+    if "packed" not in doc:
+        return doc
+
+    packed = doc["packed"]
+    lines: List[str] = decompress(packed["codec"], bytes(packed["lines"])).decode("utf-8").split("\n")
+    sections = []
+    for section in packed["sections"]:
+        plain_section = {k: v for k, v in section.items() if k != "lines"}
+        plain_section["content"] = "\n".join(lines[i] for i in section["lines"])
+        sections.append(plain_section)
+
+    plain = {k: v for k, v in doc.items() if k != "packed"}
+    plain["sections"] = sections
+    return plain
+
+def song_for_storage(song_dict: dict) -> dict:
+    return pack_song(song_dict) if storage_mode() == "packed" else song_dict
@@ -0,0 +1,101 @@
+import hashlib
+import os
+from functools import cache
+from typing import Dict, List, Optional
+
+from .models import TemplateInfo
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.path.join(os.path.dirname(BASE_DIR), 'templates')
+
+SIZE_CLASSES = ('small', 'medium', 'large')
+
+# Font sizes per template size class
+FONT_MAP = {
+    'small': {'title': 70, 'song': 53, 'bible': 43, 'tithing': 32},
+    'medium': {'title': 50, 'song': 33, 'bible': 32, 'tithing': 23},
+    'large': {'title': 40, 'song': 27, 'bible': 23, 'tithing': 16}
+}
+
+# Layout every generated slide used before the manifest existed
+DEFAULT_BLANK_LAYOUT = 6
+
+def size_class(path: str) -> str:
+    """Templates live in Small/Medium/Large folders, fall back to the file name."""
+    relative = os.path.relpath(path, TEMPLATES_DIR).lower()
+    folder = relative.split(os.sep)[0]
+    if folder in SIZE_CLASSES:
+        return folder
+    for size in SIZE_CLASSES:
+        if size in os.path.basename(relative):
+            return size
+    return 'medium'
+
+def find_blank_layout(prs) -> int:
+    layouts = list(prs.slide_layouts)
+    for i, layout in enumerate(layouts):
+        if layout.name.strip().lower() == 'blank':
+            return i
+    return min(DEFAULT_BLANK_LAYOUT, len(layouts) - 1)
+
+@cache
+def get_template_manifest() -> Dict[str, TemplateInfo]:
+    """
+    Describes every template once per process. Ids are the file names without
+    extension (e.g. "med_11"), sorted so selection is stable between runs.
+    """
+    from .generator import load_template
+
+    if not os.path.exists(TEMPLATES_DIR):
+        raise FileNotFoundError(f"Templates directory not found: {TEMPLATES_DIR}")
+
+    paths = []
+    for root, dirs, files in os.walk(TEMPLATES_DIR):
+        for file in files:
+            if file.endswith(".pptx"):
+                paths.append(os.path.join(root, file))
+
+    manifest = {}
+    for path in sorted(paths):
+        prs = load_template(path)
+        size = size_class(path)
+        template_id = os.path.splitext(os.path.basename(path))[0]
+        manifest[template_id] = TemplateInfo(
+            id=template_id,
+            path=os.path.relpath(path, TEMPLATES_DIR),
+            size=size,
+            fonts=FONT_MAP[size],
+            blank_layout=find_blank_layout(prs),
+            slide_width=prs.slide_width,
+            slide_height=prs.slide_height,
+        )
+
+    if not manifest:
+        raise FileNotFoundError("No .pptx templates found.")
+    return manifest
+
+def template_path(info: TemplateInfo) -> str:
+    return os.path.join(TEMPLATES_DIR, info.path)
+
+def seeded_choice(options: list, seed: str):
+    """Like random.choice, but the same seed always picks the same option."""
+    digest = hashlib.sha256(seed.encode("utf-8")).hexdigest()
+    return options[int(digest, 16) % len(options)]
+
+def select_template(size: Optional[str] = "medium", template_id: Optional[str] = None, seed: str = "") -> TemplateInfo:
+    """
+    Picks a template by id, or deterministically among the templates of a size:
+    the same seed always lands on the same template.
+    """
+    manifest = get_template_manifest()
+    if template_id:
+        if template_id not in manifest:
+            raise FileNotFoundError(f"Unknown template: {template_id}")
+        return manifest[template_id]
+
+    candidates: List[TemplateInfo] = list(manifest.values())
+    if size:
+        sized = [info for info in candidates if info.size == size.lower()]
+        candidates = sized or candidates
+
+    return seeded_choice(candidates, seed)
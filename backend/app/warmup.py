@@ -0,0 +1,57 @@
+import os
+import time
+from typing import Dict
+
+from .database import db
+from .providers import get_provider
+
+# Comma separated list of things to preload at startup, e.g. "templates,assets,db".
+# Empty by default so serverless cold starts only pay for what they ask for.
+WARMUP_STEPS = ("templates", "assets", "db", "providers")
+
+def requested_steps() -> list:
+    raw = os.environ.get("WARMUP", "")
+    steps = [step.strip().lower() for step in raw.split(",") if step.strip()]
+    if "all" in steps:
+        return list(WARMUP_STEPS)
+    return [step for step in steps if step in WARMUP_STEPS]
+
+def warm_templates():
+    # Building the manifest reads and parses every template (python-pptx, lxml)
+    from .templates_index import get_template_manifest
+    get_template_manifest()
+
+def warm_assets():
+    from .generator import ASSETS_DIR, load_file_bytes
+    for root, dirs, files in os.walk(ASSETS_DIR):
+        for file in files:
+            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                load_file_bytes(os.path.join(root, file))
+
+def warm_providers():
+    for name in ("gemini", "genius", "google_translate", "bible_extractor"):
+        try:
+            get_provider(name)
+        except Exception as e:
+            print(f"Warmup could not create {name}: {e}")
+
+async def run_warmup() -> Dict[str, float]:
+    """Runs the requested warmup steps and returns how long each took in ms."""
+    from fastapi.concurrency import run_in_threadpool
+
+    timings = {}
+    for step in requested_steps():
+        started = time.perf_counter()
+        try:
+            if step == "db":
+                await db.command("ping")
+            elif step == "templates":
+                await run_in_threadpool(warm_templates)
+            elif step == "assets":
+                await run_in_threadpool(warm_assets)
+            elif step == "providers":
+                await run_in_threadpool(warm_providers)
+        except Exception as e:
+            print(f"Warmup step {step} failed: {e}")
+        timings[step] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+import time
+
+# Fails (exit code 1) if a fresh interpreter takes longer than the budget to import the app.
+# Run from the backend directory: python check_import_time.py [budget_ms]
+BUDGET_MS = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.environ.get("IMPORT_BUDGET_MS", "1500"))
+
+def measure() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return (time.perf_counter() - started) * 1000
+
+if __name__ == "__main__":
+    # Best of three so a busy machine doesn't cause false failures
+    best = min(measure() for _ in range(3))
+    print(f"import app.main: {best:.0f}ms (budget {BUDGET_MS:.0f}ms)")
+    if best > BUDGET_MS:
+        print("Over budget. Run `python -X importtime -c 'import app.main'` to find the slow imports.")
+        sys.exit(1)
@@ -0,0 +1,82 @@
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Dict
+
+# Stand-ins for the upstream services. Each one sleeps for a configurable,
+# slightly jittered latency so the app's thread pool and outbound scheduler
+# behave as they would against the real thing.
+DEFAULT_LATENCY = {
+    "gemini": 0.8,
+    "genius": 1.2,
+    "translate": 0.2,
+    "bible": 0.4,
+}
+
+def sleep_for(seconds: float):
+    if seconds > 0:
+        time.sleep(seconds * random.uniform(0.75, 1.25))
+
+class FakeGeminiModels:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_content(self, model: str, contents: str, config: dict = None):
+        sleep_for(self.latency)
+        if config and config.get("response_mime_type") == "application/json":
+            sections = [
+                {"label": "Verse 1", "content": "Fake verse line one\nFake verse line two"},
+                {"label": "Chorus", "content": "Fake chorus line one\nFake chorus line two"},
+            ]
+            # Batched structuring asks for one list of sections per song
+            songs = len(re.findall(r"=== SONG \d+ ===", contents))
+            text = json.dumps([sections] * songs if songs else sections)
+        elif "bible passage" in contents:
+            text = "\n".join(f"{i} Fake verse number {i} of the passage." for i in range(1, 7))
+        else:
+            # Translation prompts end with the text to translate
+            lines = contents.strip().split("\n\n")[-1].split("\n")
+            text = "\n".join(f"[zh] {line}" for line in lines)
+        return SimpleNamespace(text=text)
+
+class FakeGemini:
+    def __init__(self, latency: float):
+        self.models = FakeGeminiModels(latency)
+
+class FakeGenius:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def search_song(self, title: str, artist: str = "", get_full_info: bool = False):
+        sleep_for(self.latency)
+        lyrics = (
+            f"[Verse 1]\n{title} line one\n{title} line two\n\n"
+            f"[Chorus]\nChorus line one\nChorus line two\n\n"
+            f"[Verse 2]\n{title} line three\n{title} line four"
+        )
+        return SimpleNamespace(title=title, artist=artist or "Fake Artist", lyrics=lyrics)
+
+class FakeBibleExtractor:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def search(self, reference: str):
+        sleep_for(self.latency)
+        return [f"Fake text of {reference}, verse {i}." for i in range(1, 6)]
+
+def fake_translate(latency: float):
+    def translate(text: str, target: str) -> str:
+        sleep_for(latency)
+        return "\n".join(f"[{target}] {line}" for line in text.split("\n"))
+    return translate
+
+def install_fakes(latency: Dict[str, float]):
+    """Points the provider registry at the fakes. Call before serving requests."""
+    from app.providers import override_provider
+
+    override_provider("gemini", FakeGemini(latency["gemini"]))
+    override_provider("genius", FakeGenius(latency["genius"]))
+    override_provider("google_translate", fake_translate(latency["translate"]))
+    override_provider("bible_extractor", lambda translation: FakeBibleExtractor(latency["bible"]))
@@ -0,0 +1,265 @@
+"""
+Load test for the FastAPI app with every upstream replaced by a local fake.
+
+Run from the backend directory:
+    python -m loadtest.run --duration 60 --concurrency 20 --mongomock
+    python -m loadtest.run --mix songs=60,bible=15,search=5,generate=20 --latency gemini=1.5
+
+Without --mongomock the app talks to MONGODB_URI (default a local mongod) and
+uses a throwaway database named by --db-name.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+from .fakes import DEFAULT_LATENCY, install_fakes
+
+ENDPOINTS = ("songs", "bible", "search", "generate")
+DEFAULT_MIX = "songs=50,bible=20,search=10,generate=20"
+BIBLE_REFS = ["John 3:16-21", "Psalm 23", "Romans 8:28-39", "Matthew 5:1-12", "Isaiah 40:28-31"]
+
+def parse_pairs(raw: str, cast=float) -> Dict[str, float]:
+    pairs = {}
+    for item in raw.split(","):
+        if item.strip():
+            key, value = item.split("=")
+            pairs[key.strip()] = cast(value)
+    return pairs
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def make_song(i: int) -> dict:
+    chorus = "\n".join(f"Chorus line {n} of song {i}" for n in range(4))
+    return {
+        "id": str(uuid.uuid4()),
+        "title": f"Load Test Song {i}",
+        "artist": "Load Test",
+        "revision": 1,
+        "sections": [
+            {"label": "Verse 1", "content": "\n".join(f"Verse one line {n} of song {i}" for n in range(6))},
+            {"label": "Chorus", "content": chorus},
+            {"label": "Verse 2", "content": "\n".join(f"Verse two line {n} of song {i}" for n in range(6))},
+            {"label": "Chorus", "content": chorus},
+        ],
+    }
+
+def configure_environment(args, cache_dir: str):
+    """Must run before the app is imported, since modules read settings on import."""
+    os.environ.setdefault("GENIUS_TOKEN", "loadtest")
+    os.environ.setdefault("GEMINI_API_KEY", "loadtest")
+    os.environ["DB_NAME"] = args.db_name
+    os.environ["GEMINI_RATE_PER_MIN"] = str(args.gemini_rate)
+    os.environ["GENIUS_RATE_PER_MIN"] = str(args.genius_rate)
+    os.environ["SLIDE_CACHE_DIR"] = os.path.join(cache_dir, "slides")
+    os.environ["PREVIEW_CACHE_DIR"] = os.path.join(cache_dir, "previews")
+    if args.no_slide_cache:
+        os.environ["SLIDE_CACHE_ENABLED"] = "false"
+
+def use_mongomock():
+    """Swaps the Motor client for an in-memory one."""
+    from mongomock_motor import AsyncMongoMockClient
+    from app.database import use_client
+
+    use_client(AsyncMongoMockClient())
+
+class LagMonitor:
+    """Measures how late the server's event loop wakes up from short sleeps."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: List[float] = []
+        self.running = True
+
+    async def run(self):
+        while self.running:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval) * 1000)
+
+def serve_in_thread(app, port: int, monitor: LagMonitor):
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+
+    loop = asyncio.new_event_loop()
+
+    def target():
+        asyncio.set_event_loop(loop)
+        loop.create_task(monitor.run())
+        loop.run_until_complete(server.serve())
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, loop
+
+async def seed_songs(count: int) -> List[dict]:
+    from app.database import db
+
+    songs = [make_song(i) for i in range(count)]
+    await db.songs.delete_many({"artist": "Load Test"})
+    await db.songs.insert_many([dict(song) for song in songs])
+    return songs
+
+def build_request(endpoint: str, songs: List[dict], rng: random.Random):
+    if endpoint == "songs":
+        return "GET", "/songs", None, None
+    if endpoint == "bible":
+        return "GET", "/bible", {"ref": rng.choice(BIBLE_REFS), "version": "NIV"}, None
+    if endpoint == "search":
+        return "GET", "/songs/search", {"title": f"Search {rng.randint(0, 10_000)}", "artist": ""}, None
+
+    picked = rng.sample(songs, k=min(4, len(songs)))
+    body = {
+        "date": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "speaker": "Load Test",
+        "topic": "Throughput",
+        "bible_readings": [{"reference": rng.choice(BIBLE_REFS), "version": "NIV"}],
+        "songs": picked[:3],
+        "response_songs": picked[3:],
+        "announcements": [{"title": "Welcome", "content": "Morning tea after the service"}],
+        "prayer_points": ["Volunteers", "Visitors"],
+        "template_name": rng.choice(["small", "medium", "large"]),
+        "translate": rng.random() < 0.3,
+    }
+    return "POST", "/generate", None, body
+
+async def drive(base_url: str, args, songs: List[dict], mix: Dict[str, float]) -> Dict[str, dict]:
+    import httpx
+
+    results = defaultdict(lambda: {"latencies": [], "errors": 0, "statuses": defaultdict(int)})
+    endpoints = list(mix.keys())
+    weights = [mix[e] for e in endpoints]
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(worker_id: int, client):
+        rng = random.Random(args.seed + worker_id)
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights=weights)[0]
+            method, path, params, body = build_request(endpoint, songs, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body)
+                status = response.status_code
+            except Exception:
+                status = "exception"
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            stats = results[endpoint]
+            stats["statuses"][status] += 1
+            if status == 200:
+                stats["latencies"].append(elapsed_ms)
+            else:
+                stats["errors"] += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        await asyncio.gather(*(worker(i, client) for i in range(args.concurrency)))
+    return results
+
+def summarize(results: Dict[str, dict], lag_samples: List[float], duration: float) -> dict:
+    report = {"duration_s": duration, "endpoints": {}}
+    for endpoint, stats in sorted(results.items()):
+        latencies = sorted(stats["latencies"])
+        report["endpoints"][endpoint] = {
+            "ok": len(latencies),
+            "errors": stats["errors"],
+            "statuses": {str(k): v for k, v in stats["statuses"].items()},
+            "throughput_rps": round(len(latencies) / duration, 2),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+        }
+    lag = sorted(lag_samples)
+    report["event_loop_lag"] = {
+        "samples": len(lag),
+        "p50_ms": round(percentile(lag, 50), 1),
+        "p99_ms": round(percentile(lag, 99), 1),
+        "max_ms": round(lag[-1], 1) if lag else 0.0,
+    }
+    return report
+
+def print_report(report: dict):
+    print(f"\n{'endpoint':<10} {'ok':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, s in report["endpoints"].items():
+        print(f"{endpoint:<10} {s['ok']:>7} {s['errors']:>7} {s['throughput_rps']:>8} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}")
+    lag = report["event_loop_lag"]
+    print(f"\nevent loop lag: p50 {lag['p50_ms']}ms, p99 {lag['p99_ms']}ms, max {lag['max_ms']}ms ({lag['samples']} samples)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the PPT Generator API against local fakes")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to drive load for")
+    parser.add_argument("--concurrency", type=int, default=10, help="simultaneous simulated volunteers")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="relative weight per endpoint")
+    parser.add_argument("--latency", default="", help="fake upstream latency in seconds, e.g. gemini=1.0,genius=2")
+    parser.add_argument("--songs", type=int, default=200, help="songs to seed the library with")
+    parser.add_argument("--seed", type=int, default=1, help="random seed, so runs are repeatable")
+    parser.add_argument("--timeout", type=float, default=120, help="per request timeout in seconds")
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory MongoDB stand-in")
+    parser.add_argument("--db-name", default="ppt_maker_loadtest", help="database to use with a real MongoDB")
+    parser.add_argument("--gemini-rate", type=float, default=6000, help="outbound Gemini quota per minute")
+    parser.add_argument("--genius-rate", type=float, default=6000, help="outbound Genius quota per minute")
+    parser.add_argument("--no-slide-cache", action="store_true", help="render every song from scratch")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    mix = parse_pairs(args.mix)
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    latency = {**DEFAULT_LATENCY, **parse_pairs(args.latency)}
+
+    cache_dir = tempfile.mkdtemp(prefix="ppt-loadtest-")
+    configure_environment(args, cache_dir)
+    if args.mongomock:
+        use_mongomock()
+
+    from app.main import app
+
+    install_fakes(latency)
+    port = free_port()
+    monitor = LagMonitor()
+    server, thread, loop = serve_in_thread(app, port, monitor)
+
+    # Seed through the server's own loop, Motor clients are tied to one event loop
+    songs = asyncio.run_coroutine_threadsafe(seed_songs(args.songs), loop).result()
+
+    print(f"Driving {args.concurrency} workers for {args.duration}s against http://127.0.0.1:{port} (mix {mix})")
+    started = time.perf_counter()
+    results = asyncio.run(drive(f"http://127.0.0.1:{port}", args, songs, mix))
+    duration = time.perf_counter() - started
+
+    monitor.running = False
+    server.should_exit = True
+    thread.join(timeout=10)
+
+    report = summarize(results, monitor.samples, duration)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ import json
 import os
 import asyncio
 from app.database import db
+from app.song_codec import song_for_storage
 
 DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'songs_db.json')
 
@@ -30,11 +31,11 @@ async def migrate():
         if 'id' in song and song['id']:
             existing = await collection.find_one({"id": song['id']})
             if not existing:
-                await collection.insert_one(song)
+                await collection.insert_one(song_for_storage(song))
                 count += 1
         else:
             # If no ID (shouldn't happen with latest code), insert it
-            await collection.insert_one(song)
+            await collection.insert_one(song_for_storage(song))
             count += 1
 
     print(f"Successfully migrated {count} songs to MongoDB.")
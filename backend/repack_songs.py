@@ -0,0 +1,24 @@
+import asyncio
+from app.database import db
+from app.song_codec import song_for_storage, unpack_song, storage_mode
+
+# Rewrites every song in the layout chosen by SONG_STORAGE (plain or packed),
+# e.g. after turning packed storage on or off. Safe to run more than once.
+async def repack():
+    mode = storage_mode()
+    print(f"Rewriting songs as {mode}...")
+
+    count = 0
+    async for doc in db.songs.find({}):
+        is_packed = "packed" in doc
+        if is_packed == (mode == "packed"):
+            continue
+        song = unpack_song(doc)
+        song.pop("_id", None)
+        await db.songs.replace_one({"_id": doc["_id"]}, song_for_storage(song))
+        count += 1
+
+    print(f"Rewrote {count} songs.")
+
+if __name__ == "__main__":
+    asyncio.run(repack())
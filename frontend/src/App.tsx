@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { api, type Song, type BibleReading } from './api';
+import { api, isConflict, type Song, type BibleReading } from './api';
 import { format, nextSunday, isSunday } from 'date-fns';
 import { Header } from './components/Header';
 import { ServiceInfo } from './components/ServiceInfo';
@@ -71,6 +71,7 @@ const App: React.FC = () => {
   const [mingleText, setMingleText] = useState(() => localStorage.getItem('ppt_mingleText') || 'Mingle time!');
 
   const [isGenerating, setIsGenerating] = useState(false);
+  const [generationStage, setGenerationStage] = useState('');
   const [translate, setTranslate] = useState(() => localStorage.getItem('ppt_translate') === 'true');
   const [language, setLanguage] = useState(() => localStorage.getItem('ppt_language') || 'Chinese (Simplified)');
 
@@ -163,6 +164,7 @@ const App: React.FC = () => {
 
   const handleGenerate = async () => {
     setIsGenerating(true);
+    setGenerationStage('');
     // Create new abort controller
     abortControllerRef.current = new AbortController();
     
@@ -183,7 +185,17 @@ const App: React.FC = () => {
         template_name: 'medium',
         translate,
         language
-      }, abortControllerRef.current.signal);
+      }, abortControllerRef.current.signal, progress => {
+        const labels: Record<string, string> = {
+          template: 'Template loaded',
+          song: `Song: ${progress.title}`,
+          translation: `Translated: ${progress.title}`,
+          reading: `Reading: ${progress.reference}`,
+          response_song: `Response song: ${progress.title}`,
+          save: 'Saving deck',
+        };
+        setGenerationStage(labels[progress.stage] || progress.stage);
+      });
     } catch (error: any) {
       if (error.name === 'CanceledError' || error.code === 'ERR_CANCELED') {
         console.log('Generation cancelled');
@@ -234,6 +246,13 @@ const App: React.FC = () => {
       refreshSongs();
       setIsEditorOpen(false);
     } catch (error) {
+      if (isConflict(error)) {
+        if (confirm('Someone else changed this song while you were editing it. Reload the latest version? Your changes will be lost.')) {
+          refreshSongs();
+          setIsEditorOpen(false);
+        }
+        return;
+      }
       console.error('Failed to save song', error);
       alert('Failed to save song.');
     }
@@ -246,6 +265,7 @@ const App: React.FC = () => {
           onGenerate={handleGenerate} 
           onCancel={handleCancel} 
           isGenerating={isGenerating} 
+          generationStage={generationStage}
           darkMode={darkMode}
           toggleDarkMode={() => setDarkMode(!darkMode)}
         />
@@ -5,6 +5,7 @@ const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 export interface SongSection {
   label: string;
   content: string;
+  ref?: string; // label of an earlier section this one repeats
 }
 
 export interface Song {
@@ -13,6 +14,13 @@ export interface Song {
   artist?: string;
   ccli_number?: string;
   sections: SongSection[];
+  arrangement?: string[]; // section labels in sung order
+  revision?: number;
+}
+
+export interface SongRef {
+  id: string;
+  revision?: number;
 }
 
 export interface BibleReading {
@@ -33,24 +41,117 @@ export interface OfferingInfo {
   details: string;
 }
 
-export interface GenerateRequest {
+export interface ChurchProfile {
+  id?: string;
+  name: string;
+  service_name: string;
+  service_time: string;
+  offering: OfferingInfo;
+  template_name: string;
+  default_language: string;
+  logo?: string; // left out of getChurches, omit to keep the stored logo
+  tithing_images?: Record<string, string>; // left out of getChurches, omit to keep the stored images
+  revision?: number;
+}
+
+export interface ServiceDetails {
   date: string;
   speaker: string;
   topic: string;
+  church_id?: string;
   church_name: string;
   service_name: string;
+  service_time?: string;
   bible_readings: BibleReading[];
-  songs: Song[];
-  response_songs: Song[];
   announcements: AnnouncementItem[];
   offering: OfferingInfo;
   prayer_points: string[];
   mingle_text: string;
   template_name: string;
+  template_id?: string;
+  template_seed?: string;
   translate: boolean;
   language: string;
 }
 
+export interface GenerateRequest extends ServiceDetails {
+  songs: Song[];
+  response_songs: Song[];
+}
+
+export interface ServicePlan extends ServiceDetails {
+  id?: string;
+  songs: SongRef[];
+  response_songs: SongRef[];
+}
+
+export interface PreviewSlide {
+  index: number;
+  hash: string;
+  url: string;
+}
+
+export interface PreviewResponse {
+  slides: PreviewSlide[];
+  rendered: number;
+  cached: number;
+}
+
+export interface TemplateInfo {
+  id: string;
+  path: string;
+  size: string;
+  fonts: Record<string, number>;
+  blank_layout: number;
+  slide_width: number;
+  slide_height: number;
+}
+
+export interface ImportItem {
+  title: string;
+  artist?: string;
+  ccli_number?: string;
+  status: 'pending' | 'fetched' | 'done' | 'skipped' | 'failed';
+  song_id?: string;
+  error?: string;
+}
+
+export interface ImportJob {
+  id: string;
+  status: 'running' | 'done' | 'failed';
+  items: ImportItem[];
+}
+
+export interface ImportProgress {
+  index: number;
+  title: string;
+  status: ImportItem['status'];
+  song_id?: string;
+  error?: string;
+}
+
+export interface GenerationRun {
+  id: string;
+  status: 'running' | 'done' | 'failed';
+  events_url: string;
+  download_url: string;
+  filename: string;
+  error?: string;
+  error_status?: number; // HTTP status of the failure, e.g. 404 for an unknown church
+}
+
+export interface GenerationProgress {
+  stage: 'template' | 'song' | 'translation' | 'reading' | 'response_song' | 'save';
+  ms: number;
+  title?: string;
+  reference?: string;
+  index?: number;
+  cached?: boolean;
+}
+
+// PUT /songs/{id} answers 409 when the song was saved by someone else since it was loaded
+export const isConflict = (error: unknown) => axios.isAxiosError(error) && error.response?.status === 409;
+
 export interface ApiService {
   getSongs: () => Promise<Song[]>;
   createSong: (song: Song) => Promise<Song>;
@@ -58,9 +159,30 @@ export interface ApiService {
   deleteSong: (id: string) => Promise<void>;
   searchSongLyrics: (title: string, artist?: string) => Promise<Song>;
   getBiblePassage: (ref: string, version: string) => Promise<any>;
-  generatePPT: (data: GenerateRequest, signal?: AbortSignal) => Promise<void>;
+  generatePPT: (data: GenerateRequest, signal?: AbortSignal, onProgress?: (progress: GenerationProgress) => void) => Promise<void>;
+  previewPPT: (data: GenerateRequest, signal?: AbortSignal) => Promise<PreviewResponse>;
+  importSetlist: (setlist: string) => Promise<ImportJob>;
+  resumeImport: (id: string) => Promise<ImportJob>;
+  watchImport: (id: string, onSong: (progress: ImportProgress) => void, onFinished: () => void) => () => void;
+  getTemplates: () => Promise<TemplateInfo[]>;
+  getChurches: () => Promise<ChurchProfile[]>;
+  saveChurch: (church: ChurchProfile) => Promise<ChurchProfile>;
+  getPlans: () => Promise<ServicePlan[]>;
+  savePlan: (plan: ServicePlan) => Promise<ServicePlan>;
+  deletePlan: (id: string) => Promise<void>;
+  generatePlanPPT: (plan: ServicePlan, signal?: AbortSignal) => Promise<void>;
 }
 
+const downloadBlob = (data: BlobPart, filename: string) => {
+  const url = window.URL.createObjectURL(new Blob([data]));
+  const link = document.createElement('a');
+  link.href = url;
+  link.setAttribute('download', filename);
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+};
+
 export const api: ApiService = {
   getSongs: async () => {
     const response = await axios.get<Song[]>(`${API_BASE_URL}/songs`);
@@ -72,6 +194,7 @@ export const api: ApiService = {
     return response.data;
   },
 
+  // Rejects with a 409 (see isConflict) if the song changed since it was loaded
   updateSong: async (song: Song) => {
     const response = await axios.put<Song>(`${API_BASE_URL}/songs/${song.id}`, song);
     return response.data;
@@ -95,19 +218,124 @@ export const api: ApiService = {
     return response.data;
   },
   
-  generatePPT: async (data: GenerateRequest, signal?: AbortSignal) => {
-    const response = await axios.post(`${API_BASE_URL}/generate`, data, {
+  generatePPT: async (data: GenerateRequest, signal?: AbortSignal, onProgress?: (progress: GenerationProgress) => void) => {
+    // Submitting the same service twice joins the run already in progress
+    const { data: run } = await axios.post<GenerationRun>(`${API_BASE_URL}/generate/runs`, data, { signal });
+
+    // Resolves true when the stream saw the run finish, false when we have to ask for its status
+    const streamed = await new Promise<boolean>((resolve, reject) => {
+      const source = new EventSource(`${API_BASE_URL}${run.events_url}`);
+      signal?.addEventListener('abort', () => {
+        source.close();
+        reject(new axios.CanceledError());
+      });
+      source.addEventListener('stage', event => onProgress?.(JSON.parse((event as MessageEvent).data)));
+      // Running on another worker, which is the only one that can stream its progress
+      source.addEventListener('running', () => {
+        source.close();
+        resolve(false);
+      });
+      source.addEventListener('finished', event => {
+        source.close();
+        const finished: GenerationRun = JSON.parse((event as MessageEvent).data);
+        if (finished.status === 'done') {
+          resolve(true);
+        } else {
+          reject(new Error(finished.error || 'Generation failed'));
+        }
+      });
+      source.onerror = () => {
+        source.close();
+        resolve(false);
+      };
+    });
+
+    if (!streamed) {
+      // A missing run (404) or a failed one ends this, only a running one is waited on
+      for (;;) {
+        const { data: status } = await axios.get<GenerationRun>(`${API_BASE_URL}/generate/runs/${run.id}`, { signal });
+        if (status.status === 'done') break;
+        if (status.status === 'failed') throw new Error(status.error || 'Generation failed');
+        await new Promise(resolve => setTimeout(resolve, 2000));
+      }
+    }
+
+    const response = await axios.get(`${API_BASE_URL}${run.download_url}`, {
+      responseType: 'blob',
+      signal,
+    });
+    downloadBlob(response.data, `Service_${data.date}.pptx`);
+  },
+
+  previewPPT: async (data: GenerateRequest, signal?: AbortSignal) => {
+    const response = await axios.post<PreviewResponse>(`${API_BASE_URL}/preview`, data, { signal });
+    // Slide images are served relative to the API
+    response.data.slides.forEach(slide => {
+      slide.url = `${API_BASE_URL}${slide.url}`;
+    });
+    return response.data;
+  },
+
+  importSetlist: async (setlist: string) => {
+    const response = await axios.post<ImportJob>(`${API_BASE_URL}/songs/import`, { setlist });
+    return response.data;
+  },
+
+  resumeImport: async (id: string) => {
+    const response = await axios.post<ImportJob>(`${API_BASE_URL}/songs/import/${id}/resume`);
+    return response.data;
+  },
+
+  watchImport: (id, onSong, onFinished) => {
+    // Returns a function that stops listening
+    const source = new EventSource(`${API_BASE_URL}/songs/import/${id}/events`);
+    source.addEventListener('song', event => onSong(JSON.parse((event as MessageEvent).data)));
+    source.addEventListener('finished', () => {
+      source.close();
+      onFinished();
+    });
+    return () => source.close();
+  },
+
+  getTemplates: async () => {
+    const response = await axios.get<TemplateInfo[]>(`${API_BASE_URL}/templates`);
+    return response.data;
+  },
+
+  getChurches: async () => {
+    const response = await axios.get<ChurchProfile[]>(`${API_BASE_URL}/churches`);
+    return response.data;
+  },
+
+  saveChurch: async (church: ChurchProfile) => {
+    const response = church.id
+      ? await axios.put<ChurchProfile>(`${API_BASE_URL}/churches/${church.id}`, church)
+      : await axios.post<ChurchProfile>(`${API_BASE_URL}/churches`, church);
+    return response.data;
+  },
+
+  getPlans: async () => {
+    const response = await axios.get<ServicePlan[]>(`${API_BASE_URL}/plans`);
+    return response.data;
+  },
+
+  savePlan: async (plan: ServicePlan) => {
+    const response = plan.id
+      ? await axios.put<ServicePlan>(`${API_BASE_URL}/plans/${plan.id}`, plan)
+      : await axios.post<ServicePlan>(`${API_BASE_URL}/plans`, plan);
+    return response.data;
+  },
+
+  deletePlan: async (id: string) => {
+    await axios.delete(`${API_BASE_URL}/plans/${id}`);
+  },
+
+  generatePlanPPT: async (plan: ServicePlan, signal?: AbortSignal) => {
+    const response = await axios.post(`${API_BASE_URL}/plans/${plan.id}/generate`, null, {
       responseType: 'blob',
       signal,
     });
-    
-    // Create a download link
-    const url = window.URL.createObjectURL(new Blob([response.data]));
-    const link = document.createElement('a');
-    link.href = url;
-    link.setAttribute('download', `Service_${data.date}.pptx`);
-    document.body.appendChild(link);
-    link.click();
-    link.remove();
+
+    downloadBlob(response.data, `Service_${plan.date}.pptx`);
   }
 };
@@ -5,11 +5,12 @@ interface HeaderProps {
   onGenerate: () => void;
   onCancel: () => void;
   isGenerating: boolean;
+  generationStage?: string;
   darkMode: boolean;
   toggleDarkMode: () => void;
 }
 
-export const Header: React.FC<HeaderProps> = ({ onGenerate, onCancel, isGenerating, darkMode, toggleDarkMode }) => {
+export const Header: React.FC<HeaderProps> = ({ onGenerate, onCancel, isGenerating, generationStage, darkMode, toggleDarkMode }) => {
   const [elapsedTime, setElapsedTime] = useState<number>(0);
   const [showHelp, setShowHelp] = useState(false);
 
@@ -73,6 +74,11 @@ export const Header: React.FC<HeaderProps> = ({ onGenerate, onCancel, isGenerati
                 </span>
                 {formatTime(elapsedTime)}
               </div>
+              {generationStage && (
+                <span className="max-w-[16rem] truncate text-sm text-gray-500 dark:text-gray-400" title={generationStage}>
+                  {generationStage}
+                </span>
+              )}
               
               <button
                 onClick={onCancel}
@@ -64,12 +64,19 @@ export const SongEditor: React.FC<SongEditorProps> = ({ song, onSave, onCancel,
 
   const handleSubmit = (e: React.FormEvent) => {
     e.preventDefault();
+    const labels = new Set(sections.map((section) => section.label));
     onSave({
+      // PUT replaces the whole song, so keep fields this form doesn't edit
+      ...song,
       id: song?.id,
       title,
       artist,
       ccli_number: ccliNumber,
       sections,
+      // Sections may have been renamed or removed since the arrangement was written
+      arrangement: song?.arrangement?.filter((label) => labels.has(label)),
+      // Lets the server refuse the save if someone else changed the song meanwhile
+      revision: song?.revision,
     });
   };
 